@@ -0,0 +1,185 @@
+"""
+Benchmarks of how the cost of building populations and simulating outbreaks on them scales with their size,
+over a standard grid of population and society types, with comparison against a saved baseline
+so that regressions in performance are flagged
+"""
+
+import json
+import logging
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from codit.disease import Covid
+from codit.outbreak import Outbreak
+from codit.population.covid import PersonCovid
+from codit.streams import seeded
+
+POPULATION_TYPES = ['Population', 'FixedNetworkPopulation', 'HouseholdWorkplacePopulation',
+                    'RadialAgePopulation', 'CityPopulation']
+SOCIETY_TYPES = ['UKSociety', 'TwoTrackSystem', 'LateralFlowUK']
+# the random-mixing Population has no network of contacts, which every testing society counts or traces,
+# so it is benchmarked only under a Society which does neither
+SOCIETIES_OF = {'Population': ['Society']}
+# random mixing meets in groups of a whole number of people, rather than the mean size of a network's cliques
+SOCIETY_ARGUMENTS = {'Society': dict(encounter_size=2)}
+SIZES = [10_000, 100_000, 1_000_000]
+
+# for each measure, whether a larger value is better
+MEASURES = {'construction_seconds': False, 'person_days_per_second': True, 'peak_rss_mb': False}
+
+
+def population_type(name):
+    from codit.population.population import Population, FixedNetworkPopulation
+    from codit.population.networks.household_workplace import HouseholdWorkplacePopulation
+    from codit.population.networks.radial_age import RadialAgePopulation
+    if name == 'CityPopulation':
+        from codit.population.networks.city import CityPopulation
+        return CityPopulation
+    return dict(Population=Population, FixedNetworkPopulation=FixedNetworkPopulation,
+                HouseholdWorkplacePopulation=HouseholdWorkplacePopulation,
+                RadialAgePopulation=RadialAgePopulation)[name]
+
+
+def society_type(name):
+    from codit.society import Society, UKSociety
+    from codit.society.lateral import LateralFlowUK
+    from codit.society.strategic import TwoTrackSystem
+    return dict(Society=Society, UKSociety=UKSociety, TwoTrackSystem=TwoTrackSystem, LateralFlowUK=LateralFlowUK)[name]
+
+
+def societies_of(population_name, society_names=None):
+    """
+    :return: those of society_names (by default, all) under which a population of this type can be simulated
+    """
+    supported = SOCIETIES_OF.get(population_name, SOCIETY_TYPES)
+    return [name for name in supported if society_names is None or name in society_names]
+
+
+def scenario_key(population_name, society_name, n_people):
+    return f"{population_name}/{society_name}/{n_people}"
+
+
+def peak_rss_mb():
+    """
+    :return: the largest resident set size this process has had so far, in megabytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10   # bytes on macOS, kilobytes elsewhere
+
+
+def run_scenario(population_name, society_name, n_people, n_days=30, seed_fraction=0.001, seed=0):
+    """
+    Build a population of n_people adopting a society, and simulate an outbreak on it for n_days.
+    :param seed_fraction: the proportion of the population to seed infections in (at least one person)
+    :return: a dict of the measures of this scenario (see MEASURES), with the size of its network and
+    the steps it simulated. Person-days are counted only over the steps simulated, not those filled in
+    once the outbreak settled.
+    """
+    society = society_type(society_name)(**SOCIETY_ARGUMENTS.get(society_name, dict()))
+    start = time.perf_counter()
+    with seeded(seed):
+        pop = population_type(population_name)(n_people, society, person_type=PersonCovid)
+    construction_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recorder = Outbreak(society, Covid(), population=pop, seed_size=max(1, int(n_people * seed_fraction)),
+                        n_days=n_days, person_type=PersonCovid, seed=seed).simulate()
+    simulation_seconds = time.perf_counter() - start
+    steps = len(recorder.main_component.story) - recorder.skipped_steps
+    person_days = n_people * steps / society.episodes_per_day
+
+    return dict(population=population_name, society=society_name, n_people=n_people, n_days=n_days,
+                construction_seconds=construction_seconds,
+                simulation_seconds=simulation_seconds,
+                simulated_steps=steps,
+                person_days_per_second=person_days / simulation_seconds,
+                peak_rss_mb=peak_rss_mb(),
+                n_cliques=len(getattr(pop, 'fixed_cliques', ())))
+
+
+def _run_scenario(*args):
+    try:
+        return run_scenario(*args)
+    except Exception as e:
+        return dict(zip(['population', 'society', 'n_people', 'n_days'], args), error=f"{type(e).__name__}: {e}")
+
+
+def run_suite(population_names=None, society_names=None, sizes=None, n_days=30, seed=0):
+    """
+    Run each scenario of the grid in a fresh process of its own, so that its peak RSS is its own,
+    and a failure (for example, a CityPopulation whose data has not been built) is reported rather than raised
+    :return: a dict with information about the machine, and a dict of results by scenario_key
+    """
+    results = dict()
+    for n_people in sizes or SIZES:
+        for population_name in population_names or POPULATION_TYPES:
+            for society_name in societies_of(population_name, society_names):
+                key = scenario_key(population_name, society_name, n_people)
+                logging.warning(f"benchmarking {key}")
+                # a pool of its own for each scenario, so a fresh process (as max_tasks_per_child, new in 3.11, would give)
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    result = pool.submit(_run_scenario, population_name, society_name, n_people, n_days, 0.001,
+                                         seed).result()
+                if 'error' in result:
+                    logging.warning(f"{key} failed: {result['error']}")
+                results[key] = result
+    return dict(machine=dict(python=platform.python_version(), platform=platform.platform(),
+                             processor=platform.processor()),
+                time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                results=results)
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    :param results: as returned by run_suite, or loaded from its file
+    :param baseline: the same, for the version to compare against
+    :param tolerance: the proportion by which a measure may be worse than its baseline before it is flagged
+    :return: a list of the regressions, each a dict naming the scenario and measure, with its value and baseline's.
+    A scenario which ran in the baseline, but now fails, is a regression in the measure 'error'.
+    """
+    regressions = []
+    for key, result in results['results'].items():
+        base = baseline['results'].get(key)
+        if base is None or 'error' in base:
+            continue
+        if 'error' in result:
+            regressions.append(dict(scenario=key, measure='error', value=result['error'], baseline=None))
+            continue
+        for measure, larger_is_better in MEASURES.items():
+            value, reference = result[measure], base[measure]
+            worse = value < reference / (1 + tolerance) if larger_is_better else value > reference * (1 + tolerance)
+            if worse:
+                regressions.append(dict(scenario=key, measure=measure, value=value, baseline=reference))
+    return regressions
+
+
+def results_table(results, baseline=None):
+    """
+    :return: a printable table of each scenario's measures, with the ratio of each to its baseline if there is one
+    """
+    lines = [f"{'scenario':<52} {'build s':>9} {'person-days/s':>14} {'peak MB':>9}"]
+    for key, result in results['results'].items():
+        if 'error' in result:
+            lines.append(f"{key:<52} {result['error']}")
+            continue
+        line = f"{key:<52} {result['construction_seconds']:>9.2f} " \
+               f"{result['person_days_per_second']:>14.0f} {result['peak_rss_mb']:>9.0f}"
+        base = (baseline or dict(results={}))['results'].get(key)
+        if base is not None and 'error' not in base:
+            ratios = [result[m] / base[m] for m in MEASURES]
+            line += "   vs baseline: " + "  ".join(f"{r:.2f}x" for r in ratios)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def save(results, filename):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=1)
+
+
+def load(filename):
+    with open(filename) as f:
+        return json.load(f)
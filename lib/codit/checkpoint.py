@@ -0,0 +1,163 @@
+"""
+Snapshots of an outbreak part way through its simulation, from which several continuations can be run
+without simulating the days before it again
+"""
+
+import io
+import logging
+import pickle
+import random
+import zlib
+
+import numpy as np
+
+from codit.config import set_config
+from codit.disease import Disease
+from codit.population.person import Person
+
+# attributes of a person which belong to the population's structure, or to the society it has adopted,
+# rather than to the state of the epidemic
+PERSON_STRUCTURE = {'name', 'cfg', 'home', 'contacts', 'symptom_register', 'episode_time', 'prob_worry'}
+
+# attributes of a society which hold the state of its testing and tracing, rather than its policies
+SOCIETY_STATE = ['test_index', 'contact_counts', 'test_recorder', 'contacts_traced']
+
+
+class _Pickler(pickle.Pickler):
+    """
+    Pickles references to the people, census, population, diseases and outbreak by name,
+    so that a snapshot holds none of the population's structure, and is restored onto the same objects
+    """
+    def __init__(self, file, outbreak):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.outbreak = outbreak
+        self.pop = outbreak.pop
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Person) and self.pop.census.get(obj.name) is obj:
+            return 'person', obj.name
+        if isinstance(obj, Disease):
+            return 'disease', str(obj)
+        if obj is self.pop.census:
+            return 'census', None
+        if obj is self.pop:
+            return 'population', None
+        if obj is self.outbreak:
+            return 'outbreak', None
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, outbreak):
+        super().__init__(file)
+        self.outbreak = outbreak
+        self.pop = outbreak.pop
+        diseases = outbreak.diseases if type(outbreak.diseases) is set else {outbreak.diseases}
+        self.diseases = {str(d): d for d in diseases}
+
+    def persistent_load(self, pid):
+        kind, key = pid
+        if kind == 'person':
+            return self.pop.census[key]
+        if kind == 'disease':
+            return self.diseases[key]
+        if kind == 'census':
+            return self.pop.census
+        if kind == 'population':
+            return self.pop
+        if kind == 'outbreak':
+            return self.outbreak
+        raise pickle.UnpicklingError(f"unknown persistent id {pid}")
+
+
+class Checkpoint:
+    """
+    The state of an outbreak after some step of its simulation: that of its people, of its society's testing,
+    of its random numbers and of its recorder. The population's structure is not part of it:
+    continuations run on the population of the outbreak it was taken from,
+    or on another built identically (for example, in a forked process).
+    """
+    def __init__(self, outbreak):
+        self.outbreak = outbreak
+        self.step_num = outbreak.step_num
+        self.time = outbreak.time
+        self.society_type = type(outbreak.society)
+        self.queue_names = [spec.name for spec in outbreak.society.scheduler.specs]
+        state = dict(people={p.name: {k: v for k, v in p.__dict__.items() if k not in PERSON_STRUCTURE}
+                             for p in outbreak.pop.people},
+                     symptomatic=outbreak.pop.symptoms.people,
+                     society={name: getattr(outbreak.society, name) for name in SOCIETY_STATE},
+                     queues={name: q.__dict__ for name, q in zip(self.queue_names, outbreak.society.queues)},
+                     streams=outbreak.streams,
+                     global_random=None if outbreak.streams else (random.getstate(), np.random.get_state()),
+                     recorder=outbreak.recorder)
+        buffer = io.BytesIO()
+        _Pickler(buffer, outbreak).dump(state)
+        self.data = zlib.compress(buffer.getvalue(), 1)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['outbreak'] = None
+        return state
+
+    def load(self, outbreak):
+        return _Unpickler(io.BytesIO(zlib.decompress(self.data)), outbreak).load()
+
+    def branch(self, society=None, seed=None, outbreak=None):
+        """
+        :param society: the society which takes over the outbreak from this step, by default that of the outbreak
+        the checkpoint was taken from, restored to how it was. A society declaring the same queues as that
+        carries on with their tests; otherwise it starts with empty queues.
+        :param seed: if given, then the continuation draws random numbers from streams derived from it,
+        rather than carrying on those of the outbreak
+        :param outbreak: the outbreak whose population and diseases to continue on, if not that the checkpoint was taken from
+        :return: a new Outbreak, in the state of this checkpoint, whose simulate() runs the remaining steps
+        """
+        from codit.outbreak import Outbreak
+        source = outbreak or self.outbreak
+        assert source is not None, "give the outbreak whose population to continue on"
+        society = society or source.society
+        assert society.episodes_per_day == source.society.episodes_per_day, "a society must keep the same time step"
+        o = Outbreak(society, source.diseases, population=source.pop, n_days=source.n_days,
+                     reset_population=False, seed=seed)
+        state = self.load(o)
+        self.restore_people(o.pop, state, society)
+        self.restore_society(society, state)
+        o.time = self.time
+        o.step_num = self.step_num
+        o.recorder = state['recorder']
+        o.recorder.profiler = o.profiler
+        if seed is None:
+            o.streams = state['streams']
+            if state['global_random'] is not None:
+                random.setstate(state['global_random'][0])
+                np.random.set_state(state['global_random'][1])
+        return o
+
+    @staticmethod
+    def restore_people(pop, state, society):
+        for person in pop.people:
+            structure = {k: v for k, v in person.__dict__.items() if k in PERSON_STRUCTURE}
+            person.__dict__.clear()
+            person.__dict__.update(structure)
+            person.__dict__.update(state['people'][person.name])
+            set_config(person, society.cfg.__dict__)
+        pop.symptoms.people = state['symptomatic']
+        Person.immunity_updates += 1   # so that caches of immunities are recomputed
+
+    def restore_society(self, society, state):
+        names = [spec.name for spec in society.scheduler.specs]
+        if sorted(names) != sorted(self.queue_names):
+            logging.warning(f"{type(society).__name__} does not declare the queues {self.queue_names}, "
+                            f"so starts with none of their tests")
+            society.clear_queues()
+            return
+        for name, value in state['society'].items():
+            setattr(society, name, value)
+        for name, q in zip(names, society.queues):
+            test_type = q.test_type
+            q.__dict__.update(state['queues'][name])
+            q.test_type = test_type
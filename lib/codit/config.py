@@ -44,6 +44,8 @@ class CFG:
 
     # Simulator
     SIMULATOR_PERIODS_PER_DAY = 1
+    SIMULATOR_DAILY_TRANSMISSION = False   # if True, then people meet once a day, with a day's chance of infection,
+    # however many periods the day is divided into for testing and isolation
 
     MEAN_NETWORK_SIZE = 1 +_TARGET_R0 / (DAYS_INFECTIOUS_TO_SYMPTOMS + DAYS_OF_SYMPTOMS) / \
                         PROB_INFECT_IF_TOGETHER_ON_A_DAY['SARS-CoV-2']
@@ -0,0 +1,226 @@
+"""
+The Looper: many runs of the Simulator over a grid of scenarios, to assess the stochasticity of the results
+and the impact of varying parameters of interest
+"""
+
+import gc
+import logging
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from codit.disease import Covid
+from codit.outbreak import Outbreak
+from codit.population.covid import PersonCovid
+from codit.streams import seeded
+
+# a population built before the pool of workers, which they share rather than build or unpickle their own
+_shared_population = None
+
+
+def build_society(society_type, society_attributes=None, config_overrides=None):
+    """
+    :param society_type: a Society subclass
+    :param society_attributes: a dict of attributes to add to or update on the new society
+    :param config_overrides: a dict of config to pass to the new society
+    :return: the society
+    """
+    soc = society_type(config=config_overrides or dict())
+    for name, val in (society_attributes or dict()).items():
+        setattr(soc, name, val)
+    return soc
+
+
+def replicate_seeds(replicates, seed=None):
+    """
+    :return: for each replicate, an independent integer seed, derived from seed (or from fresh entropy if it is None)
+    """
+    children = np.random.SeedSequence(seed).spawn(replicates)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def summarize_run(name, replicate, recorder, keep_story=False, keep_recorder=False):
+    """
+    :return: a compact dict of the results of one run, which is cheap to send between processes
+    """
+    story = recorder.main_component.story
+    result = dict(name=name,
+                  replicate=replicate,
+                  pc_infected=story[-1][1] * 100,
+                  r0=recorder.realized_r0,
+                  pc_queueing=story[-1][4] * 100,
+                  skipped_steps=recorder.skipped_steps)
+    if keep_story:
+        result['story'] = np.array(story, dtype=float)
+    if keep_recorder:
+        result['recorder'] = recorder
+    return result
+
+
+def _share_population(population):
+    global _shared_population
+    _shared_population = population
+
+
+def run_replicate(population_factory, scenarios, replicate, seed, seed_size, n_days,
+                  disease_factory=None, keep_stories=False, keep_recorders=False):
+    """
+    Build one population, and simulate each scenario on it in turn.
+    Each run draws from random streams of its own (see codit.streams), derived from seed and the scenario's position,
+    so that its outcome depends only on these and not on which process, or which other runs, came before it.
+    :param population_factory: a picklable function of no arguments, returning a population,
+    or None to use the population shared by this process's parent
+    :param scenarios: a list of pairs (name, (society_type, society_attributes, config_overrides))
+    :param disease_factory: a picklable function of the config overrides, returning the disease(s) to seed;
+    by default Covid(config=config_overrides)
+    :return: a list of compact results, one for each scenario
+    """
+    seed_everything(seed)
+    with seeded(seed):
+        pop = population_factory() if population_factory else _shared_population
+    results = []
+    for i, (name, (society_type, society_attributes, config_overrides)) in enumerate(scenarios):
+        logging.info(f"starting on {name}, replicate {replicate}")
+        soc = build_society(society_type, society_attributes, config_overrides)
+        diseases = disease_factory(config_overrides) if disease_factory else Covid(config=config_overrides or dict())
+        recorder = Outbreak(soc, diseases, population=pop, seed_size=seed_size, n_days=n_days,
+                            person_type=PersonCovid, seed=np.random.SeedSequence([seed, i])).simulate()
+        results.append(summarize_run(name, replicate, recorder, keep_stories, keep_recorders))
+    return results
+
+
+def iterate_ensemble(population_factory, scenarios, replicates, seed_size, n_days, seed=None,
+                     max_workers=None, max_in_flight=None, disease_factory=None,
+                     keep_stories=False, keep_recorders=False, population=None):
+    """
+    Simulate every scenario, replicates times, over a pool of processes.
+    Each replicate is one task: it builds a population from population_factory, and runs every scenario on it,
+    so that the scenarios are compared on common populations.
+    :param population_factory: a picklable function of no arguments, returning a population, or None if population is
+    :param population: instead, a population built once, in this process, on which every replicate runs.
+    Its structure (people, homes, cliques and contacts) is not copied to the workers but shared with them,
+    where processes can be forked, and each worker resets only the epidemic state of its own copy of the people.
+    :param scenarios: a dict mapping names to triples (society_type, society_attributes, config_overrides)
+    :param replicates: the number of times to simulate each scenario
+    :param seed: the seed from which the replicates' seeds are derived, so that the whole ensemble is reproducible
+    :param max_workers: the number of processes. If this is 1, then everything runs in this process.
+    :param max_in_flight: the greatest number of replicates submitted to the pool at once, by default 2 * max_workers
+    :return: a generator of compact results (see summarize_run), yielded as each replicate finishes
+    """
+    assert (population_factory is None) != (population is None), "provide either a population or its factory"
+    scenarios = list(scenarios.items())
+    seeds = replicate_seeds(replicates, seed)
+    tasks = ((population_factory, scenarios, r, s, seed_size, n_days, disease_factory, keep_stories, keep_recorders)
+             for r, s in enumerate(seeds))
+    start = time.time()
+
+    def progress(done):
+        elapsed = time.time() - start
+        logging.info(f"finished {done}/{replicates} replicates of {len(scenarios)} scenarios "
+                     f"in {elapsed:.0f}s, about {elapsed / done * (replicates - done):.0f}s to go")
+
+    if max_workers == 1:
+        _share_population(population)
+        try:
+            for done, task in enumerate(tasks, 1):
+                yield from run_replicate(*task)
+                progress(done)
+        finally:
+            _share_population(None)
+        return
+
+    max_workers = max_workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * max_workers
+    with _pool(max_workers, population) as pool:
+        in_flight = set()
+        done = 0
+        for task in tasks:
+            in_flight.add(pool.submit(run_replicate, *task))
+            if len(in_flight) < max_in_flight:
+                continue
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done += 1
+                yield from future.result()
+                progress(done)
+        for future in _as_finished(in_flight):
+            done += 1
+            yield from future.result()
+            progress(done)
+
+
+class _pool(ProcessPoolExecutor):
+    """
+    A pool of processes sharing population.
+    Where processes can be forked, the workers inherit it from this process, copying only the pages of memory
+    they write to. The garbage collector's own bookkeeping would otherwise touch every object as it scans them,
+    so the objects which exist beforehand are frozen out of its reach while the pool is open.
+    Elsewhere each worker unpickles population once, as it starts, rather than for every task.
+    """
+    def __init__(self, max_workers, population):
+        self.frozen = population is not None and 'fork' in multiprocessing.get_all_start_methods()
+        if self.frozen:
+            _share_population(population)
+            gc.collect()
+            gc.freeze()
+            super().__init__(max_workers=max_workers, mp_context=multiprocessing.get_context('fork'))
+        elif population is not None:
+            super().__init__(max_workers=max_workers, initializer=_share_population, initargs=(population,))
+        else:
+            super().__init__(max_workers=max_workers)
+
+    def shutdown(self, *args, **kwargs):
+        super().shutdown(*args, **kwargs)
+        if self.frozen:
+            gc.unfreeze()
+            self.frozen = False
+            _share_population(None)
+
+
+def _as_finished(futures):
+    while futures:
+        finished, futures = wait(futures, return_when=FIRST_COMPLETED)
+        yield from finished
+
+
+def run_ensemble(*args, **kwargs):
+    """
+    As iterate_ensemble, but wait for every run to finish
+    :return: a dict mapping each scenario's name to its list of results, ordered by replicate
+    """
+    results = dict()
+    for result in iterate_ensemble(*args, **kwargs):
+        results.setdefault(result['name'], []).append(result)
+    for runs in results.values():
+        runs.sort(key=lambda r: r['replicate'])
+    return results
+
+
+def summary_table(results):
+    """
+    :param results: a dict mapping each scenario's name to its list of results, as returned by run_ensemble
+    :return: a printable table of, for each scenario, the mean percent of the population ever infected,
+    the standard error of that mean, the mean realized R0, the mean percent of the population waiting for a test,
+    and the number of runs
+    """
+    lines = [f"{'config':<60} pc_infected (mean  &  std)    R0      q%/head   num_runs"]
+    for name, runs in sorted(results.items()):
+        infection_percent = [r['pc_infected'] for r in runs]
+        test_backlog = [r['pc_queueing'] for r in runs]
+        r0s = [r['r0'] for r in runs]
+        lines.append(f"{name:<60}         "
+                     f"    {np.mean(infection_percent):<2.2f}"
+                     f"    {np.std(infection_percent) / np.sqrt(len(infection_percent)):2.4f}"
+                     f"    {np.mean(r0s):2.2f}"
+                     f"    {np.mean(test_backlog):2.2f}"
+                     f"    {len(test_backlog)}")
+    return "\n".join(lines)
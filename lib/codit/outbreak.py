@@ -1,23 +1,42 @@
 import logging
 
+from codit.checkpoint import Checkpoint
 from codit.outbreak_recorder import OutbreakRecorder
 from codit.population.covid import PersonCovid
 from codit.population.population import FixedNetworkPopulation
+from codit.profiler import PhaseProfiler
+from codit.streams import as_streams, seeded
 
 
 class Outbreak:
+
+    # once nothing more can happen, fill in the remaining steps rather than simulate them. Only an outbreak
+    # with streams of its own does so: one drawing from the global random and numpy.random simulates every step,
+    # so that whatever runs after it in the same process draws the same numbers as it always did
+    STOP_WHEN_SETTLED = True
+
     def __init__(self, society, diseases=set(), pop_size=0, seed_size=0, n_days=0,
                  population=None,
                  population_type=None,
                  person_type=None,
                  show_heatmap=False,
-                 reset_population=True):
-
-        self.pop = self.prepare_population(pop_size, population, population_type, society, person_type,
-                                           reset=reset_population)
-        if reset_population:
-            society.clear_queues()
-            self.pop.seed_infections(seed_size, diseases, society)
+                 reset_population=True,
+                 seed=None,
+                 profile=False):
+        """
+        :param seed: an int, numpy.random.Generator or codit.streams.RandomStreams, from which this outbreak draws
+        all its random numbers, independently of any other; or None to draw from the global random and numpy.random
+        :param profile: if True, then time each phase of each step, and each recorder component,
+        and count the work done, in a codit.profiler.PhaseProfiler found at self.recorder.profiler
+        """
+        self.profiler = PhaseProfiler() if profile else None
+        self.streams = as_streams(seed) if seed is not None else None
+        with seeded(self.streams):
+            self.pop = self.prepare_population(pop_size, population, population_type, society, person_type,
+                                               reset=reset_population)
+            if reset_population:
+                society.clear_queues()
+                self.pop.seed_infections(seed_size, diseases, society)
 
         self.initialize_timers(n_days, society.episodes_per_day)
         self.group_size = society.encounter_size
@@ -50,6 +69,7 @@ class Outbreak:
 
     def set_recorder(self, recorder=None, show_heatmap=False):
         self.recorder = recorder or OutbreakRecorder(self, show_heatmap)
+        self.recorder.profiler = self.profiler
 
     def initialize_timers(self, n_days, enc_per_day):
         self.n_days = n_days
@@ -59,12 +79,28 @@ class Outbreak:
         self.time = 0
         self.step_num = 0
 
-    def simulate(self):
-        for t in range(self.n_periods):
-            self.update_time()
-            self.society.manage_outbreak(self.pop)
-            self.pop.attack_in_groupings(self.group_size)
-            self.record_state()
+    def simulate(self, until_day=None, stop=None):
+        """
+        :param until_day: if given, then stop after this day, so that the rest can be simulated later (or branched
+        from a checkpoint); otherwise carry on to the end
+        :param stop: a function of this outbreak, checked after each step, eg lambda o: o.pop.count_infected() > 1000.
+        If it returns True, then the simulation stops there.
+        """
+        until = self.n_periods if until_day is None else min(until_day * self.society.episodes_per_day, self.n_periods)
+        with seeded(self.streams):
+            while self.step_num < until:
+                if self.profiler is None:
+                    self.update_time()
+                    self.society.manage_outbreak(self.pop)
+                    self.transmit()
+                    self.record_state()
+                else:
+                    self.profiled_step()
+                if stop is not None and stop(self):
+                    logging.info(f"Stopping on day {self.time:.2f}, as asked")
+                    break
+                if self.STOP_WHEN_SETTLED and self.streams is not None and self.settled():
+                    self.fast_fill(until)
 
         self.recorder.realized_r0 = self.pop.realized_r0()
         self.recorder.society_config = self.society.cfg
@@ -76,11 +112,71 @@ class Outbreak:
 
         return self.recorder
 
+    def profiled_step(self):
+        profiler = self.profiler
+        with profiler.phase('update_time'):
+            self.update_time()
+        traced = self.society.contacts_traced
+        with profiler.phase('manage_outbreak'):
+            self.society.manage_outbreak(self.pop)
+        profiler.count('tests processed', sum(len(q.completed_tests) for q in self.society.queues))
+        profiler.count('contacts traced', self.society.contacts_traced - traced)
+        attacks = self.pop.attacks_attempted
+        with profiler.phase('attack_in_groupings'):
+            self.transmit()
+        profiler.count('attacks attempted', self.pop.attacks_attempted - attacks)
+        with profiler.phase('record_step'):
+            self.record_state()
+
+    def settled(self):
+        """
+        :return: whether nothing more can happen: nobody is infected and not yet recovered, nobody is tested,
+        waiting for a test or isolating, and the society will do nothing unprompted.
+        The cheap checks come first, so that this costs little while the epidemic is under way.
+        """
+        return (self.society.idle() and self.recorder.main_component.settled() and self.recorder.can_fill()
+                and self.pop.settled())
+
+    def fast_fill(self, until):
+        """
+        Record the steps up to until as the same as the last, without simulating them
+        """
+        times = []
+        while self.step_num < until:
+            self.time += self.time_increment
+            self.step_num += 1
+            times.append(self.time)
+        self.recorder.fill(times)
+        logging.info(f"Nothing more could happen after day {times[0] - self.time_increment:.2f}, "
+                     f"so skipped the remaining {len(times)} steps")
+
+    def checkpoint(self):
+        """
+        :return: a codit.checkpoint.Checkpoint of the state of the simulation so far,
+        from which continuations can be run, perhaps under other societies, with its branch() method
+        """
+        return Checkpoint(self)
+
     def update_time(self):
         self.pop.update_time(self.society)
         self.time += self.time_increment
         self.step_num += 1
 
+    def transmit(self):
+        """
+        People meet and infect one another each period, or if the society's daily_transmission is set,
+        only in the last period of each day, with a whole day's chance of infection:
+        so that a day divided into several periods for the timing of tests and isolation costs little more to simulate
+        than a day of one period.
+        While nobody is infectious, and meeting draws no random numbers, nothing could come of it, so it is skipped.
+        """
+        daily = self.society.daily_transmission
+        if daily and self.step_num % self.society.episodes_per_day != 0:
+            return
+        if self.pop.quiescent():
+            return
+        self.pop.attack_in_groupings(self.group_size, days=1 if daily else None)
+
     def record_state(self):
         self.recorder.record_step(self)
 
@@ -1,18 +1,18 @@
 import logging
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
-import geopandas as gpd
 
-from codit.outbreakvisualiser import VisualizerComponent
 from codit.disease import ifr, hospitalization
-from codit.population.networks.home_locations import DISTRICT_PARAMETERS
+
+# matplotlib, pandas and geopandas are imported only when first plotting or tabulating, so that simulating needs none of them
 
 class OutbreakRecorder:
     def __init__(self, o, show_heatmap=False):
         self.realized_r0 = None
+        self.skipped_steps = 0   # steps filled in without being simulated, once the epidemic was over
+        self.profiler = None   # a codit.profiler.PhaseProfiler, set by an Outbreak which profiles its steps
         self.components = [MainComponent()]
         if show_heatmap:
+            from codit.outbreakvisualiser import VisualizerComponent
             self.components.append(VisualizerComponent(False, o))
         self.main_component = self.components[0]
 
@@ -20,8 +20,27 @@ class OutbreakRecorder:
         self.components.append(component)
 
     def record_step(self, o):
+        """
+        Update each component with the state of the outbreak, timing each in self.profiler if there is one
+        """
+        if self.profiler is None:
+            for component in self.components:
+                component.update(o)
+            return
+        for component in self.components:
+            with self.profiler.phase(f"record_step/{type(component).__name__}"):
+                component.update(o)
+
+    def can_fill(self):
+        return all(hasattr(component, 'fill') for component in self.components)
+
+    def fill(self, times):
+        """
+        Record steps at each of times, at which nothing changes from the last step recorded
+        """
         for component in self.components:
-            component.update(o)
+            component.fill(times)
+        self.skipped_steps += len(times)
 
     def plot(self, **kwargs):
         df = self.get_dataframe()
@@ -32,6 +51,7 @@ class OutbreakRecorder:
                      f"percent of the population was infected during the epidemic")
 
     def get_dataframe(self):
+        import pandas as pd
         df = pd.DataFrame(self.main_component.story)
         df.columns = ['days of epidemic', 'ever infected', 'infectious',
                       'tested daily', 'waiting for test results', 'isolating']  # , 'daily_detected_']
@@ -51,7 +71,7 @@ class MainComponent:
                 o.pop.count_infected() / N,
                 o.pop.count_infectious() / N,
                 len(all_completed_tests) / N / o.time_increment,
-                sum(len([t for t in q.tests if t.swab_taken]) for q in o.society.queues) / N,
+                sum(q.swabbed_count for q in o.society.queues) / N,
                 sum(p.isolating for p in o.pop.people) / N,
                 ]
         self.story.append(step)
@@ -60,6 +80,16 @@ class MainComponent:
             logging.info(f"Day {int(step[0])}, prop infected is {step[1]:2.2f}, "
                          f"prop infectious is {step[2]:2.4f}")
 
+    def fill(self, times):
+        last = self.story[-1]
+        self.story.extend([t] + last[1:] for t in times)
+
+    def settled(self):
+        """
+        :return: whether, at the last step, nobody was infectious, tested, waiting for a test, or isolating
+        """
+        return bool(self.story) and not any(self.story[-1][2:])
+
 
 class MorbidityComponent:
     def __init__(self, people):
@@ -99,6 +129,10 @@ class VariantComponent:
                            [o.pop.count_infected(d) for d in variants],
                            [o.pop.count_infectious(d) for d in variants]])
 
+    def fill(self, times):
+        last = self.story[-1]
+        self.story.extend([t] + [list(x) for x in last[1:]] for t in times)
+
 
 class WardComponent:
     def __init__(self, o):
@@ -115,16 +149,21 @@ class WardComponent:
         for ward in self.wards:
             self.people_of[ward] = [p for p in o.pop.people if p.home.ward == ward]
 
-        self.shapes = self.prepare_map_shapes()
+        self.city = getattr(o.pop, 'city', None)
+        self._shapes = None
+
+    @property
+    def shapes(self):
+        """
+        The ward boundaries are only loaded when a map is first drawn
+        """
+        if self._shapes is None:
+            self._shapes = self.prepare_map_shapes()
+        return self._shapes
 
     def prepare_map_shapes(self):
-        pop_df = pd.read_csv(DISTRICT_PARAMETERS['Ward']['population_data_file'])
-        pop_df.set_index('wd20cd', inplace=True)
-        shapes = gpd.read_file(DISTRICT_PARAMETERS['Ward']['shape_file'])
-        shapes.set_index('wd20cd', inplace=True)
-        shapes = shapes.loc[pop_df.index]
-        shapes.set_index('wd20nm', inplace=True)
-        return shapes
+        from codit.population.networks.home_locations import clipped_ward_shapes
+        return clipped_ward_shapes(self.city)
 
     def update(self, o):
         self.infected.append([o.time] +
@@ -160,6 +199,7 @@ class WardComponent:
                                )
 
     def dataframe(self, story):
+        import pandas as pd
         df = pd.DataFrame(story)
         df.columns = ['days of epidemic'] + [w.name for w in self.wards]
         df = df.T
@@ -174,6 +214,7 @@ class WardComponent:
         self.plot_all_timeseries(df, rates_title, y_legend)
 
     def plot_all_timeseries(self, df, rates_title, y_legend):
+        import matplotlib.pyplot as plt
         ax = df.plot(grid=True, figsize=(12, 8), title=rates_title)
         plt.legend(loc='right', bbox_to_anchor=(1.4, 0.5))
         ax.set_ylabel(y_legend)
@@ -189,6 +230,8 @@ class WardComponent:
         return df
 
     def map_incidence(self, wardlevel_data, title='', end_date=False, per_hundred_k=False):
+        import matplotlib.pyplot as plt
+        import pandas as pd
         infect_over_time = self.dataframe(wardlevel_data)
         incidence = infect_over_time.mean().T
         if end_date:
@@ -197,7 +240,7 @@ class WardComponent:
         incidence.columns = ['incidence']
         if per_hundred_k:
             incidence *= 100000
-        results = gpd.GeoDataFrame(pd.merge(incidence, self.shapes.geometry, right_index=True, left_index=True))
+        results = self.shapes[['geometry']].join(incidence, how='inner')
         fig, ax = plt.subplots(1, 1)
         ax.axes.get_yaxis().set_visible(False)
         ax.axes.get_xaxis().set_visible(False)
@@ -3,23 +3,56 @@ from matplotlib.animation import ArtistAnimation
 import numpy as np
 
 
-def setup_range_for_heatmap(pop, bin_num):
+def home_coordinates(pop):
+    """
+    :param pop: population
+    :return: an array of shape (number of people, 2) holding the lon and lat of each person's home building,
+    or NaN for people without a located home
+    """
+    coords = np.full((len(pop.people), 2), np.nan)
+    for i, p in enumerate(pop.people):
+        if p.home is not None and p.home.building.lon is not None:
+            coords[i] = p.home.building.lon, p.home.building.lat
+    return coords
+
+
+def setup_range_for_heatmap(pop, bin_num, coords=None):
     """
     Establish range of all coordinates of the population's households for every heatmap generated later
     :param pop: population
     :param bin_num: bins size for histogram2d
+    :param coords: the output of home_coordinates(pop), if already to hand
     :return: range of all households coordinates on city map e.g. Leeds [-1.7776973000000003, -1.3100551999999999, 53.7060248, 53.942890000000006]
     """
-    all_pop_coords = [[p.home.coordinate['lon'], p.home.coordinate['lat']] for p in pop.people if p.home is not None]
-    if len(all_pop_coords) > 0:
-        all_pop_coords_list = list(zip(*all_pop_coords))
-        heatmap, xedges, yedges = np.histogram2d(all_pop_coords_list[0], all_pop_coords_list[1], bins=bin_num)
+    coords = home_coordinates(pop) if coords is None else coords
+    located = coords[~np.isnan(coords[:, 0])]
+    if len(located) > 0:
+        heatmap, xedges, yedges = np.histogram2d(located[:, 0], located[:, 1], bins=bin_num)
         extent = [xedges[0], xedges[-1], yedges[0], yedges[-1]]
     else:
         extent = [0, 0, 0, 0]
     return extent
 
 
+def bin_indices(coords, heatmap_range, bin_num):
+    """
+    :param coords: the output of home_coordinates(pop)
+    :param heatmap_range: [xmin, xmax, ymin, ymax] as from setup_range_for_heatmap()
+    :param bin_num: bins size for the histogram
+    :return: for each person, the flat index of the histogram2d bin in which their home lies, or -1 if it lies in none
+    """
+    def _axis_bins(x, lower, upper):
+        edges = np.linspace(lower, upper, bin_num + 1)
+        idx = np.searchsorted(edges, x, side='right') - 1
+        idx[x == edges[-1]] = bin_num - 1  # as in np.histogram2d, the rightmost edge is in the last bin
+        idx[np.isnan(x) | (idx < 0) | (idx >= bin_num)] = -1
+        return idx
+
+    ix = _axis_bins(coords[:, 0], heatmap_range[0], heatmap_range[1])
+    iy = _axis_bins(coords[:, 1], heatmap_range[2], heatmap_range[3])
+    return np.where((ix >= 0) & (iy >= 0), ix * bin_num + iy, -1)
+
+
 class OutbreakVisualiser:
 
     def __init__(self, pop):
@@ -29,8 +62,22 @@ class OutbreakVisualiser:
         self.fig = self.plt.figure(dpi=150)
         self.album_animation = []
         self.bin_num = max(int(300*len(pop.people)/1000000), 150)
-        # set up heatmap range with all population's coordinates
-        self.heatmap_range = setup_range_for_heatmap(pop, self.bin_num)
+        # set up heatmap range with all population's coordinates, and the bin of each person's home
+        coords = home_coordinates(pop)
+        self.heatmap_range = setup_range_for_heatmap(pop, self.bin_num, coords=coords)
+        self.bin_of_home = bin_indices(coords, self.heatmap_range, self.bin_num)
+        # the positions of the people who have a disease, kept up to date as they are infected and recover,
+        # so that only they are looked at for each heatmap
+        self.people = list(pop.people)
+        self.position = {p.name: i for i, p in enumerate(self.people)}
+        self.unwell = {i for i, p in enumerate(self.people) if p.disease is not None}
+        pop.symptoms.watch(self.note_change)
+
+    def note_change(self, person):
+        if person.disease is None:
+            self.unwell.discard(self.position[person.name])
+        else:
+            self.unwell.add(self.position[person.name])
 
     def generate_heatmap(self, o):
         """
@@ -38,21 +85,18 @@ class OutbreakVisualiser:
         :param o: instance of Outbreak
         :return:
         """
-        if o.pop.count_infectious() > 0:
-            coord = [[p.home.coordinate['lon'], p.home.coordinate['lat']] for p in o.pop.people if
-                     p.infectious and (p.home is not None)]
-            if len(coord) > 0:
-                coord_column_list = list(zip(*coord))
-                # param range in np.histogram2d: The leftmost and rightmost edges: [[xmin, xmax], [ymin, ymax]]
-                # All values outside of this range will be considered outliers and not tallied in the histogram.
-                heatmap, xedges, yedges = np.histogram2d(coord_column_list[0], coord_column_list[1], bins=self.bin_num,
-                                                         range=[[self.heatmap_range[0], self.heatmap_range[1]],
-                                                                [self.heatmap_range[2], self.heatmap_range[3]]])
-
-                extent = [xedges[0], xedges[-1], yedges[0], yedges[-1]]
+        infectious = np.array([i for i in self.unwell if self.people[i].infectious], dtype=np.int64)
+        n_infectious = len(infectious)
+        if n_infectious > 0:
+            infectious_bins = self.bin_of_home[infectious]
+            infectious_bins = infectious_bins[infectious_bins >= 0]
+            if len(infectious_bins) > 0:
+                heatmap = np.bincount(infectious_bins, minlength=self.bin_num ** 2).reshape(self.bin_num, self.bin_num)
+
+                extent = self.heatmap_range
                 ax = self.plt.gca()
                 vartext = ax.text(0.1, 1.02,
-                        f'Day {int(o.time)}, prop infectious is {(o.pop.count_infectious() / len(o.pop.people)):2.4f} '
+                        f'Day {int(o.time)}, prop infectious is {(n_infectious / len(o.pop.people)):2.4f} '
                         f'in simulated Leeds',
                         transform=ax.transAxes)
 
@@ -61,7 +105,6 @@ class OutbreakVisualiser:
                 self.album_animation.append([self.plt.imshow(heatmap.T, extent=extent, origin='lower', vmin=0, vmax=20),
                                              vartext])
 
-
     def show_heatmap_video(self, is_html5=False):
         """
         show heatmap_video in notebook
@@ -1,7 +1,7 @@
-import random
 import numpy as np
 
 from codit.population.person import Person
+from codit.streams import STREAMS
 
 
 class PersonCovid(Person):
@@ -17,6 +17,7 @@ class PersonCovid(Person):
     def set_infected(self, disease, infector=None):
         Person.set_infected(self, disease, infector=infector)
         self.infectious = False
+        self.note_symptoms()
 
     def update_disease(self, days, society):
         """
@@ -27,8 +28,9 @@ class PersonCovid(Person):
             self.infectious = True
 
         elif np.isclose(days, cov.days_before_infectious + cov.days_to_symptoms):
-            if random.random() < cov.prob_symptomatic:
+            if STREAMS.people.random() < cov.prob_symptomatic:
                 self._symptomatic = True
+                self.note_symptoms()
                 self.react_to_new_symptoms(society)
 
         elif np.isclose(days, cov.days_before_infectious + cov.days_infectious):
@@ -36,13 +38,13 @@ class PersonCovid(Person):
             self.recover()
 
     def react_to_new_symptoms(self, society):
-        if random.random() < self.cfg.PROB_ISOLATE_IF_SYMPTOMS:
+        if STREAMS.people.random() < self.cfg.PROB_ISOLATE_IF_SYMPTOMS:
             self.isolate()
-        if random.random() < self.cfg.PROB_APPLY_FOR_TEST_IF_SYMPTOMS:
+        if STREAMS.people.random() < self.cfg.PROB_APPLY_FOR_TEST_IF_SYMPTOMS:
             society.get_test_request(self, notes='symptoms')
 
     def update_time(self, society):
-        if random.random() < self.prob_worry:
+        if STREAMS.people.random() < self.prob_worry:
             self.react_to_new_symptoms(society)
         Person.update_time(self, society)
 
@@ -50,11 +52,10 @@ class PersonCovid(Person):
         if not positive:
             if self.isolating:
                 self.leave_isolation()   # TODO: even if it was a lateral flow test that turned out negative!
-        elif random.random() < self.cfg.PROB_ISOLATE_IF_TESTPOS:
+        elif STREAMS.people.random() < self.cfg.PROB_ISOLATE_IF_TESTPOS:
             self.isolate()
 
     def consider_leaving_isolation(self, society):
-        if self.isolation.days_elapsed > self.cfg.DURATION_OF_ISOLATION:
-            society.remove_stale_test(self)
-            if not society.currently_testing(self):
-                self.leave_isolation()
+        society.remove_stale_test(self)
+        if not society.currently_testing(self):
+            self.leave_isolation()
@@ -1,4 +1,3 @@
-import random
 import numpy as np
 import logging
 from collections import defaultdict
@@ -8,17 +7,30 @@ from codit.population.networks import household_workplace
 from codit.population.networks.city_config.city_cfg import MINIMUM_WORKING_AGE, MAXIMUM_WORKING_AGE, MAXIMUM_CLASS_AGE, MINIMUM_CLASS_AGE, AVERAGE_HOUSEHOLD_SIZE
 from codit.population.networks.city_config.typical_households import build_characteristic_households
 from codit.population.networks.home_locations import Home, get_home_samples
+from codit.population.networks.proximity import build_proximity_pairs
 from codit.population.covid import PersonCovid
+from codit.streams import STREAMS, seeded
 
 EPHEMERAL_CONTACT = 0.1  # people per day
 WITHIN_BUILDING_CONTACT = 0.75
+PROXIMITY_CONTACT = 0.  # people per day, each living within PROXIMITY_RADIUS_METRES
+PROXIMITY_RADIUS_METRES = 100.
 
 
 class CityPopulation(FixedNetworkPopulation):
-    def __init__(self, n_people, society, person_type=None, lockdown_config=None):
-        Population.__init__(self, n_people, society, person_type=person_type or PersonCovid)
-        self.households, self.workplaces, self.classrooms, self.care_homes, self.buildings = build_city_structures(self.census)
-        self.set_structure(society, lockdown_config=lockdown_config)
+    def __init__(self, n_people, society, person_type=None, lockdown_config=None, city=None, seed=None):
+        """
+        :param city: a key of city_cfg.city_paras whose home catalogue has been built into its own data namespace,
+        or None to use the default city's data
+        :param seed: an int or numpy.random.Generator from which to draw the city (see codit.streams),
+        or None to draw from the current streams
+        """
+        with seeded(seed):
+            Population.__init__(self, n_people, society, person_type=person_type or PersonCovid)
+            self.city = city
+            self.households, self.workplaces, self.classrooms, self.care_homes, self.buildings = \
+                build_city_structures(self.census, city=city)
+            self.set_structure(society, lockdown_config=lockdown_config)
 
     def fix_cliques(self, encounter_size, group_size=None, lockdown_config=None):
         """
@@ -27,7 +39,8 @@ class CityPopulation(FixedNetworkPopulation):
         :param lockdown_config: determines how lockdown affects the network structure
         :return:
         """
-        cfg = {'classrooms': 0, 'workplaces': 0, 'ephemeral_contact': EPHEMERAL_CONTACT}
+        cfg = {'classrooms': 0, 'workplaces': 0, 'ephemeral_contact': EPHEMERAL_CONTACT,
+               'proximity_contact': PROXIMITY_CONTACT, 'proximity_radius': PROXIMITY_RADIUS_METRES}
         cfg.update(lockdown_config or dict())
         static_cliques = self.build_city_cliques(cfg)
         logging.info(f"Adding {len(static_cliques)} permanent contact groups")
@@ -41,7 +54,13 @@ class CityPopulation(FixedNetworkPopulation):
         logging.info(f"Adding {len(building_cliques)} contacts each within one of the {len(self.buildings)} buildings "
                      f"(contact density of {WITHIN_BUILDING_CONTACT})")
 
-        return static_cliques + dynamic_cliques + building_cliques
+        proximity_cliques = []
+        if cfg['proximity_contact'] > 0:
+            proximity_cliques = build_proximity_pairs(self.people, cfg['proximity_contact'], cfg['proximity_radius'])
+            logging.info(f"Adding {len(proximity_cliques)} contacts between people living within "
+                         f"{cfg['proximity_radius']} metres of one another")
+
+        return static_cliques + dynamic_cliques + building_cliques + proximity_cliques
 
     def build_city_cliques(self, lockdown_config, by_deprivation=True):
 
@@ -78,7 +97,7 @@ def _suppress(workplaces, name, lockdown_factor, census, by_deprivation=True):
         """
         return lockdown_factor + (_dep(grp) * (1 - lockdown_factor))
 
-    open_workplaces = [g for g in workplaces if random.random() > _prob_lockdown(g)]
+    open_workplaces = [g for g in workplaces if STREAMS.structure.random() > _prob_lockdown(g)]
     report_lockdown(income_decile, lockdown_factor, name, open_workplaces)
     return open_workplaces
 
@@ -94,17 +113,18 @@ def report_lockdown(income_decile, lockdown_factor, name, open_workplaces):
                  f"{np.mean(workplace_deciles):2.2f} (and st dev {np.std(workplace_deciles):2.2f}).")
 
 
-def build_city_structures(census, schools_by_ward=True):
+def build_city_structures(census, schools_by_ward=True, city=None):
     """
     :param census: a lookup of population.covid.PersonCovid() objects, by id/name
     :param schools_by_ward: bool. If True, then school classrooms will contain only children of the same ward
+    :param city: a key of city_cfg.city_paras, or None for the default city
     :return: a list of little sets, each is a 'clique' in the graph, some are households, some are workplaces
     each individual should belong to exactly one household and one workplace
     for example: [{person_0, person_1, person_2}, {person_0, person_10, person_54, person_88, person_550, person_270}]
     - except not everyone is accounted for of course
     """
     people = list(census.values())
-    households = build_households(people)
+    households = build_households(people, city=city)
     report_size(households, 'households')
 
     buildings = build_buildings(people)
@@ -113,7 +133,7 @@ def build_city_structures(census, schools_by_ward=True):
     classrooms = build_classes_by_ward(people) if schools_by_ward else build_class_groups(people)
 
     working_age_people = [p for p in people if MINIMUM_WORKING_AGE < p.age < MAXIMUM_WORKING_AGE]
-    teachers = random.sample(working_age_people, len(classrooms))
+    teachers = STREAMS.structure.sample(working_age_people, len(classrooms))
     classrooms = [clss | {teachers[i].name} for i, clss in enumerate(classrooms)]
     report_size(classrooms, 'classrooms')
 
@@ -121,7 +141,7 @@ def build_city_structures(census, schools_by_ward=True):
     carers = assign_staff(care_homes, working_age_people)
 
     working_age_people = list(set(working_age_people) - set(teachers) - set(carers))
-    random.shuffle(working_age_people)
+    STREAMS.structure.shuffle(working_age_people)
     workplaces = build_workplaces(working_age_people)
     report_size(workplaces, 'workplaces')
 
@@ -140,7 +160,7 @@ def is_care_home(home, census):
 def assign_staff(care_homes, working_age_people, staff=5):
     carers = set()
     for home in care_homes:
-        home_carers = set(random.sample(working_age_people, staff))
+        home_carers = set(STREAMS.structure.sample(working_age_people, staff))
         home |= {c.name for c in home_carers}
         carers |= home_carers
     report_size(care_homes, 'care_homes')
@@ -155,7 +175,7 @@ def build_class_groups(people, class_size=30):
     classrooms = []
     for kids_age in range(MINIMUM_CLASS_AGE, MAXIMUM_CLASS_AGE + 1):
         schoolkids = [p for p in people if p.age == kids_age]
-        random.shuffle(schoolkids)
+        STREAMS.structure.shuffle(schoolkids)
         classrooms += build_workplaces(schoolkids, force_size=class_size)
     return classrooms
 
@@ -178,9 +198,10 @@ def build_buildings(people):
     return list(bdngs.values())
 
 
-def build_households(people):
+def build_households(people, city=None):
     """
     :param people: a list of population.covid.PersonCovid() objects
+    :param city: a key of city_cfg.city_paras, or None for the default city
     :return: a list of households, where households are a list of person's names. Also assigns ages to people.
     """
     n_individuals = len(people)
@@ -189,7 +210,7 @@ def build_households(people):
     num_h = int(n_individuals / AVERAGE_HOUSEHOLD_SIZE)
     household_examples = build_characteristic_households(num_h)
     # create num_h of homes
-    homes_examples = get_home_samples(num_h)
+    homes_examples = get_home_samples(num_h, city=city)
     logging.debug(f"There are {len(homes_examples)} households generated for accommodation buildings")
 
     while assigned < n_individuals:
@@ -221,7 +242,7 @@ def next_household_ages(household_list):
     :return: randomly select a type of household from a distribution suitable to City,
     and return the list of the ages of the people in that household
     """
-    return random.choice(household_list)
+    return STREAMS.structure.choice(household_list)
 
 
 def build_workplaces(people, force_size=None):
@@ -250,7 +271,7 @@ def build_workplaces(people, force_size=None):
 
 
 def next_workplace_size():
-    return random.choice(household_workplace.WORKPLACE_SIZE_REPRESENTATIVE_EXAMPLES)
+    return STREAMS.structure.choice(household_workplace.WORKPLACE_SIZE_REPRESENTATIVE_EXAMPLES)
 
 
 def next_household_home(homes_examples):
@@ -259,5 +280,5 @@ def next_household_home(homes_examples):
     :param: homes_examples
     :return: one home ['lon', 'lat', 'building_type']
     """
-    return random.choice(homes_examples)
+    return STREAMS.structure.choice(homes_examples)
 
@@ -1,8 +1,8 @@
 import logging
-import random
 import numpy as np
 
 from codit.population.networks.city_config import city_cfg as cfg
+from codit.streams import STREAMS
 
 
 def build_characteristic_households(total_h=50000):
@@ -52,7 +52,7 @@ def house(n, weights, house_size=None, a=0, b=0):
 
     for x in range(0, int(n)):
         if house_size is None:
-            house_size = random.randint(a, b)
+            house_size = STREAMS.structure.randint(a, b)
         inside_list = pick_age(house_size, weights)
         h += [inside_list]
 
@@ -91,7 +91,7 @@ def pick_age(num_people, weights):
     """
     inside_list, n = [], 0
     while n < num_people:
-        rand = random.randint(0, len(weights) - 1)
+        rand = STREAMS.structure.randint(0, len(weights) - 1)
         age = age_randomizer(weights[rand])
         inside_list += [age]
         n += 1
@@ -107,7 +107,7 @@ def truncated_poisson(lam, size):
     """
     poissons = np.zeros(size)
     while min(poissons) == 0:
-        new_poissons = np.random.poisson(lam, size=size)
+        new_poissons = STREAMS.structure.np.poisson(lam, size=size)
         poissons[poissons < 1] = new_poissons[poissons < 1]
     return poissons
 
@@ -119,5 +119,5 @@ def age_randomizer(x):
     """
     x = int(x)
     if x < 20 or (25 < x < 85):
-        return random.randint(x, x + 9)
-    return random.randint(x, x + 4)
+        return STREAMS.structure.randint(x, x + 9)
+    return STREAMS.structure.randint(x, x + 4)
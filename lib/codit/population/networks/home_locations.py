@@ -1,18 +1,19 @@
 """
-An spatial attribute for each household
+An spatial attribute for each household.
+geopandas is imported only by the functions which handle shapes, so that building a city from its home list needs none of it
 """
 
 import pandas as pd
 import os
 import smart_open
 import numpy as np
-import random
 from codit.config import DATA_PATH, POPULATION_LSOA_CSV
-from codit.population.networks.regions import Ward, LSOA, Building
+from codit.population.networks.regions import Ward, LSOA, Building, add_lsoa_features
 from codit.population.networks.city_config.city_cfg import AVERAGE_HOUSEHOLD_SIZE
 import logging
-import geopandas as gpd
+import hashlib
 import time
+from codit.streams import STREAMS
 
 COORDINATES_CSV = os.path.join(DATA_PATH, 'city', 'population', 'coordinates.csv')
 TYPES_CONSTRAINTS_CSV = os.path.join(DATA_PATH, 'city', 'population', 'types_households_constraints.csv')
@@ -24,6 +25,7 @@ COORDINATES_LSOA_CSV = os.path.join(DATA_PATH, 'city', 'population', 'coordinate
 WARDS_SHAPEFILE_PATH = os.path.join(DATA_PATH, 'UK_regions', 'Wards_May_2020_Boundaries_UK_BGC.shp')
 LSOA_SHAPEFILE_PATH = os.path.join(DATA_PATH, 'UK_regions', 'LSOA_December_2011_Generalised_Clipped__Boundaries_in_England_and_Wales.shp')
 DEFAULT_DISTRICT_TYPE = 'Ward'
+WARD_SHAPES_TOLERANCE = 20  # metres, in the British National Grid of the wards shapefile
 
 DISTRICT_PARAMETERS = \
     {
@@ -51,6 +53,42 @@ DISTRICT_PARAMETERS = \
         }
     }
 
+_HOME_CATALOGUES = dict()
+
+
+def city_population_dir(city=None):
+    """
+    :param city: a key of city_cfg.city_paras, or None for the default city, whose data sit directly in city/population
+    :return: the directory holding that city's population data
+    """
+    if city is None:
+        return os.path.join(DATA_PATH, 'city', 'population')
+    return os.path.join(DATA_PATH, 'city', city, 'population')
+
+
+def coordinates_csv(city=None):
+    return os.path.join(city_population_dir(city), 'coordinates.csv')
+
+
+def full_home_list_csv(city=None):
+    return os.path.join(city_population_dir(city), 'full_home_list.csv')
+
+
+def district_parameters(city=None):
+    """
+    :param city: a key of city_cfg.city_paras, or None for the default city
+    :return: a copy of DISTRICT_PARAMETERS, whose intermediary and population data files lie in that city's namespace
+    """
+    if city is None:
+        return DISTRICT_PARAMETERS
+    data_dir = city_population_dir(city)
+    params = {district_type: dict(p) for district_type, p in DISTRICT_PARAMETERS.items()}
+    for p in params.values():
+        for f in ('intermediary_file', 'population_data_file'):
+            p[f] = os.path.join(data_dir, os.path.basename(p[f]))
+    return params
+
+
 building_types = ["apartments",
                   "bungalow",
                   "cabin",
@@ -81,13 +119,65 @@ class Home:
         self.lsoa = LSOA(lsoa_code, lsoa_name)
 
 
-def get_population_district(district_type = DEFAULT_DISTRICT_TYPE):
+def ward_shapes_path(city=None, tolerance=WARD_SHAPES_TOLERANCE):
+    """
+    :param city: a key of city_cfg.city_paras, or None for the default city
+    :return: the path of the clipped ward boundaries for that city, keyed by its list of wards, the tolerance
+    to which they are simplified, and the path and modification time of the shapefile they are clipped from
+    """
+    ward_params = district_parameters(city)['Ward']
+    codes = pd.read_csv(ward_params['population_data_file'])[ward_params['join_column']]
+    shape_file = os.path.abspath(ward_params['shape_file'])
+    modified = os.path.getmtime(shape_file) if os.path.exists(shape_file) else None
+    fingerprint = f"{','.join(sorted(codes))}|{tolerance}|{shape_file}|{modified}"
+    key = hashlib.sha1(fingerprint.encode()).hexdigest()[:12]
+    return os.path.join(city_population_dir(city), f'ward_shapes_{key}.gpkg')
+
+
+def build_ward_shapes(city=None, tolerance=WARD_SHAPES_TOLERANCE):
+    """
+    Clip the UK ward boundaries down to the wards of the city, simplify them, and save them in a small file
+    :param city: a key of city_cfg.city_paras, or None for the default city
+    :param tolerance: the tolerance passed to GeoSeries.simplify()
+    :return: the path of the saved file
+    """
+    import geopandas as gpd
+    ward_params = district_parameters(city)['Ward']
+    pop_df = pd.read_csv(ward_params['population_data_file'])
+    pop_df.set_index(ward_params['join_column'], inplace=True)
+    shapes = gpd.read_file(ward_params['shape_file'], columns=ward_params['shape_file_columns'])
+    shapes.set_index(ward_params['join_column'], inplace=True)
+    shapes = shapes.loc[pop_df.index]
+    shapes['geometry'] = shapes.geometry.simplify(tolerance, preserve_topology=True)
+    path = ward_shapes_path(city, tolerance)
+    shapes.reset_index().to_file(path, driver='GPKG')
+    logging.info(f"Saved the boundaries of {len(shapes)} wards to {path}")
+    return path
+
+
+def clipped_ward_shapes(city=None):
+    """
+    :param city: a key of city_cfg.city_paras, or None for the default city
+    :return: a GeoDataFrame of the city's ward boundaries, indexed by ward name. The first call clips these
+    from the UK wards shapefile, and later calls (for the same list of wards) read them back from a small file.
+    """
+    import geopandas as gpd
+    path = ward_shapes_path(city)
+    if not os.path.exists(path):
+        build_ward_shapes(city)
+    shapes = gpd.read_file(path)
+    shapes.set_index('wd20nm', inplace=True)
+    return shapes
+
+
+def get_population_district(district_type = DEFAULT_DISTRICT_TYPE, city=None):
     """
     Get Population of each ward in a LA
     :param district_type: district type, 'Ward' or 'LSOA' for now
+    :param city: a key of city_cfg.city_paras, or None for the default city
     :return: return list of [str(pop_ward['ward_code']), str(pop_ward['ward_name']), int(pop_ward['population'])]
     """
-    df_population_district = pd.read_csv(DISTRICT_PARAMETERS[district_type]['population_data_file'])
+    df_population_district = pd.read_csv(district_parameters(city)[district_type]['population_data_file'])
     return df_population_district.to_dict('records')
 
 
@@ -146,7 +236,7 @@ def allocate_households_to_each_building(df_types_average_households, list_coord
     for _, hh_types in df_types_average_households.iterrows():
         if hh_types['number'] > 0:
             list_num_households_per_type = hh_types['min_households'] + \
-                                           np.random.poisson(hh_types['mean_minus_min'], size=hh_types['number'])
+                                           STREAMS.structure.np.poisson(hh_types['mean_minus_min'], size=hh_types['number'])
             df_temp = homes[homes['building_type'] == hh_types['building_type']]
             df_temp['num_of_households'] = list_num_households_per_type
             df_result = pd.concat([df_result, df_temp])
@@ -175,14 +265,16 @@ def allocate_homes_to_district(total_h, coords_per_district):
     return list_households_info
 
 
-def build_households_home_list(test=False):
+def build_households_home_list(test=False, city=None):
     """
     :param district_type:  district type, 'Ward' or 'LSOA' for now
+    :param city: a key of city_cfg.city_paras, or None for the default city
     Build a full list of households: ['lon', 'lat', 'building_type'] with 'district_code', 'district_name'
     :return: a full list of ['lon', 'lat', 'building_type', 'district_code', 'district_name']
     """
-    df_coordinates_ward = pd.read_csv(DISTRICT_PARAMETERS['Ward']['intermediary_file'])
-    df_coordinates_lsoa = pd.read_csv(DISTRICT_PARAMETERS['LSOA']['intermediary_file'])
+    district_params = district_parameters(city)
+    df_coordinates_ward = pd.read_csv(district_params['Ward']['intermediary_file'])
+    df_coordinates_lsoa = pd.read_csv(district_params['LSOA']['intermediary_file'])
     if test:
         df_coordinates_ward = df_coordinates_ward[::100]
         df_coordinates_lsoa = df_coordinates_lsoa[::100]
@@ -195,7 +287,7 @@ def build_households_home_list(test=False):
     # remove coordinates without either Wards or LSOAs:
     df_coordinates.dropna(inplace=True)
     coords_types = df_coordinates.to_dict('records')
-    population_district = get_population_district('Ward')
+    population_district = get_population_district('Ward', city=city)
     list_households_info = []
     for pop_district in population_district:
         tmp_coords_district = []
@@ -210,18 +302,28 @@ def build_households_home_list(test=False):
 
     df_home_list = pd.DataFrame(list_households_info)[df_coordinates.columns]
     if not test:
-        df_home_list.to_csv(FULL_HOME_LIST_CSV, index=False)
+        df_home_list.to_csv(full_home_list_csv(city), index=False)
     return df_home_list
 
 
-def get_home_samples(total_h=50000):
-    home_specs = []
-    df_home_specs = pd.read_csv(FULL_HOME_LIST_CSV)
-    home_specs = df_home_specs.values.tolist()
+def load_home_catalogue(city=None):
+    """
+    :param city: a key of city_cfg.city_paras, or None for the default city
+    :return: that city's full home list, read once per process and cached thereafter
+    """
+    if city not in _HOME_CATALOGUES:
+        if city is not None:
+            add_lsoa_features(district_parameters(city)['LSOA']['population_data_file'])
+        _HOME_CATALOGUES[city] = pd.read_csv(full_home_list_csv(city)).values.tolist()
+    return _HOME_CATALOGUES[city]
+
+
+def get_home_samples(total_h=50000, city=None):
+    home_specs = load_home_catalogue(city)
     if len(home_specs) < total_h:
         return home_specs
     else:
-        return random.sample(home_specs, total_h)
+        return STREAMS.structure.sample(home_specs, total_h)
 
 
 def generate_average_number_homes_for_building_type(total_h, coords_types):
@@ -262,31 +364,34 @@ def generate_average_number_homes_for_building_type(total_h, coords_types):
     return df_types_constraints_households
 
 
-def allocate_coordinates_to_districts(district_type=DEFAULT_DISTRICT_TYPE, test=False):
+def allocate_coordinates_to_districts(district_type=DEFAULT_DISTRICT_TYPE, test=False, city=None):
     """
     Allocate coordinates to geographic districts by examine the shapefile of that district
     :param district_type:  district type, 'Ward' or 'LSOA' for now
+    :param city: a key of city_cfg.city_paras, or None for the default city
     :return: a dataframe of coordinates with respective district name and code, also save the result to intermediary csv file
     """
+    import geopandas as gpd
+    district_params = district_parameters(city)
 
     # Obtain coordinates.csv
-    df_home_list = pd.read_csv(COORDINATES_CSV)
+    df_home_list = pd.read_csv(coordinates_csv(city))
     if test:
         df_home_list = df_home_list.loc[::100].reset_index()
     # Obtain geodataframe from shapefile of all districts
-    districts_shapes_gdf_full = gpd.read_file(DISTRICT_PARAMETERS[district_type]['shape_file'])
-    districts_shapes_gdf = districts_shapes_gdf_full[DISTRICT_PARAMETERS[district_type]['shape_file_columns']].copy()
+    districts_shapes_gdf_full = gpd.read_file(district_params[district_type]['shape_file'])
+    districts_shapes_gdf = districts_shapes_gdf_full[district_params[district_type]['shape_file_columns']].copy()
 
     # #### Obtain list of districts names
-    fn = DISTRICT_PARAMETERS[district_type]['population_data_file']
+    fn = district_params[district_type]['population_data_file']
     with smart_open.open(fn) as fh:
         sample_districts_names_df = pd.read_csv(fh)
         if test:
             sample_districts_names_df = sample_districts_names_df.loc[::5]
 
     # #### Pare down districts shapes dataframe into only the relevant districts (ones in Samples)
-    sample_districts_shapes_gdf = districts_shapes_gdf.loc[districts_shapes_gdf[DISTRICT_PARAMETERS[district_type]
-    ['join_column']].isin(list(sample_districts_names_df[DISTRICT_PARAMETERS[district_type]['join_column']]))]
+    sample_districts_shapes_gdf = districts_shapes_gdf.loc[districts_shapes_gdf[district_params[district_type]
+    ['join_column']].isin(list(sample_districts_names_df[district_params[district_type]['join_column']]))]
 
     # Create geodataframe, same as df_home_list but with a geometry column containing Point objects made from lon/lat
     gdf_home_list = gpd.GeoDataFrame(df_home_list,
@@ -298,7 +403,7 @@ def allocate_coordinates_to_districts(district_type=DEFAULT_DISTRICT_TYPE, test=
 
     df_home_district_list = df_home_list.copy()
     new_columns = [['']*2]*len(df_home_district_list.index)
-    df_home_district_list[DISTRICT_PARAMETERS[district_type]['output_additional_columns']] = new_columns
+    df_home_district_list[district_params[district_type]['output_additional_columns']] = new_columns
     number_outliers = 0
     print_every = 500
     start_time = time.time()
@@ -315,8 +420,8 @@ def allocate_coordinates_to_districts(district_type=DEFAULT_DISTRICT_TYPE, test=
         for district_index, district_row in sample_districts_shapes_gdf.iterrows():
             # TODO: this could be materially sped up by making a quick guess of the district
             if district_row["geometry"].contains(home_pt):
-                df_home_district_list.loc[home_index, DISTRICT_PARAMETERS[district_type]['output_additional_columns']] = \
-                    district_row.loc[DISTRICT_PARAMETERS[district_type]["district_columns"]].values
+                df_home_district_list.loc[home_index, district_params[district_type]['output_additional_columns']] = \
+                    district_row.loc[district_params[district_type]["district_columns"]].values
                 missing_district = False
                 break
         if missing_district:
@@ -325,5 +430,5 @@ def allocate_coordinates_to_districts(district_type=DEFAULT_DISTRICT_TYPE, test=
     # Save dataframe with homes and district info to csv file
     sample_homes_districts_df_nogeo = df_home_district_list.drop("geometry", axis=1)
     if not test:
-        sample_homes_districts_df_nogeo.to_csv(DISTRICT_PARAMETERS[district_type]['intermediary_file'], index=False)
+        sample_homes_districts_df_nogeo.to_csv(district_params[district_type]['intermediary_file'], index=False)
     return sample_homes_districts_df_nogeo
@@ -1,10 +1,10 @@
 import networkx as nx
-import random
 import itertools
 import numpy as np
 import logging
 
 from codit.population import FixedNetworkPopulation
+from codit.streams import STREAMS
 
 _h = []
 for i in range(6):
@@ -24,7 +24,7 @@ def build_cliques(census):
     people = list(census.values())
     logging.info("Building households")
     household_graph = partition_graph(len(people), HOUSEHOLD_SIZES_OF_REPRESENTATIVE_PEOPLE, 1, 0)
-    node_mapping = {i: people[i] for i in range(len(people))}
+    node_mapping = {i: people[i].name for i in range(len(people))}
     households = nx.relabel_nodes(household_graph, node_mapping)
     logging.info("Done households, now moving on to workplaces")
 
@@ -33,13 +33,13 @@ def build_cliques(census):
 
     logging.info("Composing households and workplaces")
     full_graph = nx.compose_all([households, workplaces])
-    return [{p.name for p in x} for x in nx.find_cliques(full_graph)]
+    return [set(x) for x in nx.find_cliques(full_graph)]
 
 
 def get_shuffle_mapping(people):
     shuffled_population = [p for p in people]
-    random.shuffle(shuffled_population)
-    return {i: shuffled_population[i] for i in range(len(people))}
+    STREAMS.structure.shuffle(shuffled_population)
+    return {i: shuffled_population[i].name for i in range(len(people))}
 
 
 def partition_graph(n, samples, p_in, p_out, directed=False, seed=None, per_population=False):
@@ -73,7 +73,7 @@ def partition_sizes(n_individuals, representative_samples, per_population=True):
         size_samples = list(itertools.chain(*([i] * (sum(representative_samples) // i) for i in representative_samples)))
     else:
         size_samples = representative_samples.copy()
-    random.shuffle(size_samples)
+    STREAMS.structure.shuffle(size_samples)
     logging.info(f"Mean size is {np.mean(size_samples)}")
     assigned = 0
     sizes = []
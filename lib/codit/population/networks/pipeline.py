@@ -0,0 +1,262 @@
+"""
+A resumable runner for the stages which lay down a city's home locations under share/codit/data
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from codit.population.networks import home_locations
+
+HASH_CHUNK_BYTES = 1 << 20
+PIPELINE_MANIFEST = os.path.join(home_locations.DATA_PATH, 'city', 'population', 'pipeline_manifest.json')
+
+STAGE_EXTRACT = 'extract_coordinates'
+STAGE_WARDS = 'allocate_coordinates_to_wards'
+STAGE_LSOA = 'allocate_coordinates_to_lsoa'
+STAGE_HOMES = 'create_full_homes_list'
+
+
+class Stage:
+    """
+    One step of the pipeline: a picklable function, the files it reads and writes,
+    and the parameters which (alongside the contents of those files) determine its outputs
+    """
+    def __init__(self, name, func, inputs=(), outputs=(), params=None, options=None, requires=()):
+        """
+        :param name: string naming the stage
+        :param func: module-level callable, run (possibly in a worker process) as func(**params, **options)
+        :param inputs: paths of the files read by the stage. Shapefiles bring their sidecar files along too.
+        :param outputs: paths of the files written by the stage
+        :param params: dict of keyword arguments to func, which are fingerprinted
+        :param options: dict of keyword arguments to func which do not affect its outputs, so are not fingerprinted
+        :param requires: names of stages whose outputs this stage reads
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or dict()
+        self.options = options or dict()
+        self.requires = set(requires)
+
+    def __repr__(self):
+        return f"Stage <{self.name}>"
+
+    def fingerprint(self):
+        """
+        :return: a hex digest of the contents of every input file, and of the parameters
+        """
+        h = hashlib.sha256()
+        h.update(self.name.encode())
+        h.update(json.dumps(self.params, sort_keys=True, default=str).encode())
+        for path in self.inputs:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{self.name} needs {path}, which does not exist")
+            for part in file_parts(path):
+                h.update(os.path.basename(part).encode())
+                h.update(hash_file(part).encode())
+        return h.hexdigest()
+
+    def run(self):
+        self.func(**self.params, **self.options)
+
+
+def file_parts(path):
+    """
+    :param path: a file path
+    :return: a list of the files making up that path, so that for 'x.shp' we also get 'x.dbf', 'x.shx' etc.
+    """
+    if path.endswith('.shp'):
+        return sorted(glob.glob(glob.escape(path[:-len('.shp')]) + '.*'))
+    return [path]
+
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_BYTES), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return dict()
+    with open(manifest_path) as fh:
+        return json.load(fh)
+
+
+def save_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def is_cached(stage, fingerprint, manifest):
+    """
+    :return: True if the stage last ran on exactly these inputs, and its outputs are still there
+    """
+    return manifest.get(stage.name) == fingerprint and all(os.path.exists(o) for o in stage.outputs)
+
+
+def run_pipeline(stages, manifest_path=PIPELINE_MANIFEST, force=False, max_workers=2):
+    """
+    Run stages in dependency order, skipping those whose cached outputs are still valid.
+    Stages that do not depend on one another run concurrently, in worker processes.
+    :param stages: a list of Stage objects. Requirements on stages not in this list are taken as already met.
+    :param manifest_path: json file holding the fingerprint of each stage when it last ran
+    :param force: if True, then rerun every stage regardless of the cache
+    :param max_workers: the number of stages allowed to run at once
+    :return: a dict from stage name to the seconds it took, or None if it was skipped
+    """
+    manifest = load_manifest(manifest_path)
+    names = {s.name for s in stages}
+    done = set()
+    pending = list(stages)
+    timings = dict()
+
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    try:
+        while pending:
+            ready = [s for s in pending if (s.requires & names) <= done]
+            assert ready, f"cyclic requirements among {pending}"
+            pending = [s for s in pending if s not in ready]
+
+            # fingerprint only once upstream stages have finished writing our inputs
+            fingerprints = {s.name: s.fingerprint() for s in ready}
+            to_run = [s for s in ready if force or not is_cached(s, fingerprints[s.name], manifest)]
+            for s in ready:
+                if s not in to_run:
+                    logging.info(f"Skipping {s.name}: its outputs are up to date")
+                    timings[s.name] = None
+
+            if executor is None or len(to_run) == 1:
+                for s in to_run:
+                    timings.update(_run_timed(s))
+            else:
+                futures = [executor.submit(_run_timed, s) for s in to_run]
+                for f in futures:
+                    timings.update(f.result())
+
+            for s in to_run:
+                manifest[s.name] = fingerprints[s.name]
+                save_manifest(manifest, manifest_path)
+            done |= {s.name for s in ready}
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    report_timings(timings)
+    return timings
+
+
+def _run_timed(stage):
+    start = time.perf_counter()
+    stage.run()
+    return {stage.name: time.perf_counter() - start}
+
+
+def report_timings(timings):
+    for name, seconds in timings.items():
+        if seconds is None:
+            logging.info(f"{name:<35} cached")
+        else:
+            logging.info(f"{name:<35} {seconds:8.1f} seconds")
+
+
+def extract_coordinates(area_str, coordinates_csv, server_sleep_seconds=10):
+    from codit.population.networks import query_accommodation_coords
+    query_accommodation_coords.request_coords_to_csv(coordinates_csv, area_str, server_sleep_seconds)
+
+
+def build_home_list(seed=None, city=None):
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    home_locations.build_households_home_list(city=city)
+
+
+def city_manifest(city=None):
+    return os.path.join(home_locations.city_population_dir(city), os.path.basename(PIPELINE_MANIFEST))
+
+
+def home_location_stages(area_str=None, server_sleep_seconds=10, seed=None, city=None):
+    """
+    :param area_str: the OpenStreetMap area queried for accommodation buildings
+    :param server_sleep_seconds: seconds to sleep between queries of the openstreetmap server
+    :param seed: seeds the random allocation of households to buildings
+    :param city: a key of city_cfg.city_paras, whose data namespace the stages read and write,
+    or None for the default city
+    :return: the four stages which lay down a city's full home list
+    """
+    params = home_locations.district_parameters(city)
+    coordinates = home_locations.coordinates_csv(city)
+
+    def _allocation(district_type, stage_name):
+        return Stage(stage_name, home_locations.allocate_coordinates_to_districts,
+                     inputs=[coordinates,
+                             params[district_type]['shape_file'],
+                             params[district_type]['population_data_file']],
+                     outputs=[params[district_type]['intermediary_file']],
+                     params=dict(district_type=district_type, city=city),
+                     requires=[STAGE_EXTRACT])
+
+    return [Stage(STAGE_EXTRACT, extract_coordinates,
+                  outputs=[coordinates],
+                  params=dict(area_str=area_str, coordinates_csv=coordinates),
+                  options=dict(server_sleep_seconds=server_sleep_seconds)),
+            _allocation('Ward', STAGE_WARDS),
+            _allocation('LSOA', STAGE_LSOA),
+            Stage(STAGE_HOMES, build_home_list,
+                  inputs=[params['Ward']['intermediary_file'],
+                          params['LSOA']['intermediary_file'],
+                          params['Ward']['population_data_file'],
+                          home_locations.TYPES_CONSTRAINTS_CSV],
+                  outputs=[home_locations.full_home_list_csv(city)],
+                  params=dict(seed=seed, city=city),
+                  requires=[STAGE_WARDS, STAGE_LSOA])]
+
+
+def build_city_dataset(city, stage_names=None, force=False, seed=None, server_sleep_seconds=10):
+    """
+    Run the home-location stages for one city, in that city's own data namespace
+    :param city: a key of city_cfg.city_paras
+    :param stage_names: the stages to run, or None for all of them
+    :return: a dict from stage name to the seconds it took, or None if it was skipped
+    """
+    from codit.population.networks.city_config.city_cfg import city_paras
+    os.makedirs(home_locations.city_population_dir(city), exist_ok=True)
+    stages = home_location_stages(area_str=city_paras[city]['area_str'],
+                                  server_sleep_seconds=server_sleep_seconds, seed=seed, city=city)
+    if stage_names is not None:
+        stages = [s for s in stages if s.name in stage_names]
+    return run_pipeline(stages, manifest_path=city_manifest(city), force=force, max_workers=1)
+
+
+def build_city_datasets(cities, stage_names=None, force=False, seed=None, server_sleep_seconds=10, max_workers=None):
+    """
+    Prepare several cities' home catalogues side by side, one city per worker process.
+    Each city reads its ward and LSOA population files from its own namespace (see home_locations.city_population_dir),
+    so run lsoa_stats and ward_stats for each city, writing into that namespace, beforehand.
+    Take care that extracting coordinates for many cities at once does not overburden OpenStreetMap's api.
+    :param cities: keys of city_cfg.city_paras
+    :return: a dict from city to its dict of stage timings
+    """
+    with ProcessPoolExecutor(max_workers=max_workers or len(cities)) as executor:
+        futures = {city: executor.submit(build_city_dataset, city, stage_names=stage_names, force=force, seed=seed,
+                                         server_sleep_seconds=server_sleep_seconds)
+                   for city in cities}
+        timings = {city: f.result() for city, f in futures.items()}
+    for city, city_timings in timings.items():
+        logging.info(f"Built the home catalogue of {city}")
+        report_timings(city_timings)
+    return timings
@@ -0,0 +1,114 @@
+"""
+Contacts between people whose homes lie near one another, found through a uniform grid over the city
+"""
+
+import logging
+
+import numpy as np
+
+from codit.streams import STREAMS
+
+METRES_PER_DEGREE_LAT = 111320.
+GRID_NEIGHBOURHOOD = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def home_positions(people):
+    """
+    :param people: a list of people, each with a home whose Building has a lon and lat
+    :return: an array of shape (len(people), 2) of approximate easting and northing in metres
+    (an equirectangular projection, which is accurate enough at the scale of a city)
+    """
+    lon = np.array([p.home.building.lon for p in people], dtype=float)
+    lat = np.array([p.home.building.lat for p in people], dtype=float)
+    metres_per_degree_lon = METRES_PER_DEGREE_LAT * np.cos(np.radians(np.nanmean(lat)))
+    return np.stack([lon * metres_per_degree_lon, lat * METRES_PER_DEGREE_LAT], axis=1)
+
+
+class HomeGrid:
+    """
+    A spatial hash of people into square cells whose side is the contact radius,
+    so that everyone within the radius of a person lies in the 3x3 block of cells around theirs
+    """
+    def __init__(self, positions, radius):
+        self.positions = positions
+        self.radius = radius
+        cells = np.floor(positions / radius).astype(np.int64)
+        self.origin = cells.min(axis=0) - 1
+        self.width = cells[:, 1].max() - self.origin[1] + 2
+        self.cell_of = self.cell_key(cells)
+        self.order = np.argsort(self.cell_of, kind='stable')
+        self.keys, self.starts, self.counts = np.unique(self.cell_of[self.order], return_index=True, return_counts=True)
+
+    def cell_key(self, cells):
+        return (cells[..., 0] - self.origin[0]) * self.width + (cells[..., 1] - self.origin[1])
+
+    def neighbourhood_counts(self, idx):
+        """
+        :param idx: indices of people
+        :return: for each person, and each of the 9 cells around theirs, the index of that cell in self.keys
+        (or -1 if it is empty), and the number of people in it
+        """
+        offsets = np.array([dx * self.width + dy for dx, dy in GRID_NEIGHBOURHOOD])
+        neighbour_keys = self.cell_of[idx][:, None] + offsets[None, :]
+        pos = np.clip(np.searchsorted(self.keys, neighbour_keys), 0, len(self.keys) - 1)
+        found = self.keys[pos] == neighbour_keys
+        return np.where(found, pos, -1), np.where(found, self.counts[pos], 0)
+
+    def random_neighbours(self, idx, rng):
+        """
+        :param idx: indices of people
+        :return: for each, a person drawn uniformly from the 3x3 block of cells around theirs
+        """
+        cell_pos, counts = self.neighbourhood_counts(idx)
+        totals = counts.sum(axis=1)
+        draws = (rng.random(len(idx)) * totals).astype(np.int64)
+        cumulative = np.cumsum(counts, axis=1)
+        column = (draws[:, None] >= cumulative).sum(axis=1)
+        chosen_cell = cell_pos[np.arange(len(idx)), column]
+        offset = draws - np.where(column > 0, cumulative[np.arange(len(idx)), column - 1], 0)
+        return self.order[self.starts[chosen_cell] + offset]
+
+
+def build_proximity_pairs(people, mean_contacts, radius, max_tries=5, rng=None):
+    """
+    :param people: a list of people, each with a located home
+    :param mean_contacts: the desired mean number of proximity contacts per person
+    :param radius: distance in metres within which homes count as near one another
+    :param max_tries: how often an unsuccessful draw (too far away, oneself, or a pair already drawn) is retried
+    :param rng: a source of uniform draws with a .random(size) method, by default the structure stream
+    :return: a list of distinct pairs {name, name} of people whose homes are within radius of one another.
+    Each person draws about mean_contacts / 2 partners among those near them, so the work is linear
+    in the number of people, rather than comparing all pairs.
+    """
+    rng = rng or STREAMS.structure.np
+    positions = home_positions(people)
+    located = ~np.isnan(positions).any(axis=1)
+    people, positions = [p for p, ok in zip(people, located) if ok], positions[located]
+    if mean_contacts <= 0 or len(people) < 2:
+        return []
+    grid = HomeGrid(positions, radius)
+
+    n_draws = int(len(people) * mean_contacts / 2)
+    sources = (rng.random(n_draws) * len(people)).astype(np.int64)
+    partners = np.full(n_draws, -1)
+    todo = np.arange(n_draws)
+    drawn = set()   # each pair found so far, as min * len(people) + max of their indices
+    for _ in range(max_tries):
+        if len(todo) == 0:
+            break
+        candidates = grid.random_neighbours(sources[todo], rng)
+        distances = np.linalg.norm(positions[candidates] - positions[sources[todo]], axis=1)
+        ok = (distances <= radius) & (candidates != sources[todo])
+        keys = (np.minimum(sources[todo], candidates) * len(people) + np.maximum(sources[todo], candidates)).tolist()
+        for k in np.flatnonzero(ok):
+            if keys[k] in drawn:
+                ok[k] = False
+            else:
+                drawn.add(keys[k])
+        partners[todo[ok]] = candidates[ok]
+        todo = todo[~ok]
+
+    found = partners >= 0
+    logging.debug(f"{len(todo)} of {n_draws} proximity draws found nobody near enough")
+    names = [p.name for p in people]
+    return [{names[i], names[j]} for i, j in zip(sources[found], partners[found])]
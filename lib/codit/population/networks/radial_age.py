@@ -1,8 +1,7 @@
-import random
-
 import numpy as np
 
 from codit.population import FixedNetworkPopulation
+from codit.streams import STREAMS
 
 
 class RadialAgePopulation(FixedNetworkPopulation):
@@ -22,7 +21,7 @@ def build_cliques(census, max_age, radius, max_group_size, mean_num_contacts):
     n_contacts = 0
     max_contacts = mean_num_contacts * n_people
     while n_contacts < max_contacts:
-        location = np.random.uniform(-max_age - radius, max_age + radius, size=len(coord[0]))
+        location = STREAMS.structure.np.uniform(-max_age - radius, max_age + radius, size=len(coord[0]))
         grp = build_clique(location, radius, people, coord, max_group_size, n_people)
         if (len(grp) > 1):  #  and (grp not in groups):
             n_contacts += (len(grp) * (len(grp) - 1))
@@ -33,14 +32,14 @@ def build_cliques(census, max_age, radius, max_group_size, mean_num_contacts):
 def locate_population(people):
     coord = []
     for person in people:
-        degree = random.random() * 2 * np.pi
-        person.age = random.random() * 60 + 20
+        degree = STREAMS.structure.random() * 2 * np.pi
+        person.age = STREAMS.structure.random() * 60 + 20
         coord.append(person.age * np.array([np.sin(degree), np.cos(degree)]))
     return np.array(coord)
 
 
 def build_clique(location, radius, people, people_coordinates, max_group_size, population_size):
-    cidx = random.sample(range(population_size), max_group_size)
+    cidx = STREAMS.structure.sample(range(population_size), max_group_size)
     diffs = people_coordinates[cidx] - location
     distances = np.sum(diffs ** 2, axis=1)
     candidates = (people[ix] for ix in cidx)
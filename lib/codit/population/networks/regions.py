@@ -50,9 +50,32 @@ class Ward(Place):
         return f"Ward <{self.name} {self.code}>"
 
 
-with smart_open.open(POPULATION_LSOA_CSV) as fh:
-    LSOAs = pd.read_csv(fh)
-LSOAs.set_index('lsoa11cd', inplace=True)
+# the features of each LSOA, by code, read from POPULATION_LSOA_CSV when the first LSOA is made
+LSOAs = None
+
+
+def read_lsoa_features(population_lsoa_csv):
+    with smart_open.open(population_lsoa_csv) as fh:
+        features = pd.read_csv(fh)
+    return features.set_index('lsoa11cd')
+
+
+def lsoa_features():
+    global LSOAs
+    if LSOAs is None:
+        LSOAs = read_lsoa_features(POPULATION_LSOA_CSV)
+    return LSOAs
+
+
+def add_lsoa_features(population_lsoa_csv):
+    """
+    Make the features of another city's LSOAs available to LSOA(), alongside those already loaded
+    :param population_lsoa_csv: a file such as sample_lsoa_population.csv.gz, in some city's data namespace
+    """
+    global LSOAs
+    loaded = lsoa_features()
+    extra = read_lsoa_features(population_lsoa_csv)
+    LSOAs = pd.concat([loaded, extra[~extra.index.isin(loaded.index)]])
 
 
 class LSOA(Place):
@@ -67,7 +90,7 @@ class LSOA(Place):
         """
         self.code = code
         self.name = name
-        self.features = LSOAs.loc[self.code].to_dict()
+        self.features = lsoa_features().loc[self.code].to_dict()
 
     def __str__(self):
         return f"LSOA <{self.name} {self.code}>"
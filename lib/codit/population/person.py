@@ -1,21 +1,86 @@
-import random
-
 from codit.config import set_config
+from codit.streams import STREAMS
+
+
+_RELEASE_PERIODS = dict()
+
+
+def periods_of_isolation(episode_time, duration):
+    """
+    :return: the fewest periods of episode_time days, after which more than duration days have elapsed
+    (summing the periods one by one, as each isolation once counted its own days)
+    """
+    key = (episode_time, duration)
+    if key not in _RELEASE_PERIODS:
+        days, periods = 0, 0
+        while not days > duration:
+            days += episode_time
+            periods += 1
+        _RELEASE_PERIODS[key] = periods
+    return _RELEASE_PERIODS[key]
 
 
 class Isolation:
+    def __init__(self, start_period=0):
+        """
+        :param start_period: the number of periods the person had lived through, when they began isolating
+        """
+        self.start_period = start_period
+
+
+class SymptomRegister:
+    """
+    The people of a population who are currently symptomatic, kept up to date as their symptoms change,
+    a list of functions called with each person whose symptoms begin, and a list of functions called
+    with each person whose infection or symptoms may have changed
+    """
     def __init__(self):
-        self.days_elapsed = 0
+        self.people = set()
+        self.onset_hooks = []
+        self.change_hooks = []
+
+    def __len__(self):
+        return len(self.people)
+
+    def subscribe(self, hook):
+        """
+        :param hook: a function of a person, called whenever someone becomes symptomatic
+        """
+        self.onset_hooks.append(hook)
+
+    def watch(self, hook):
+        """
+        :param hook: a function of a person, called whenever they may have been infected, recovered,
+        or had their symptoms change
+        """
+        self.change_hooks.append(hook)
+
+    def update(self, person):
+        for hook in self.change_hooks:
+            hook(person)
+        if person.symptomatic:
+            if person not in self.people:
+                self.people.add(person)
+                for hook in self.onset_hooks:
+                    hook(person)
+        else:
+            self.people.discard(person)
 
-    def update_time(self, timedelta):
-        self.days_elapsed += timedelta
+    def clear(self):
+        self.people.clear()
 
 
 class Person:
+
+    immunity_updates = 0   # counts calls to update_immunities, by anyone, so that caches of immunities can tell they are stale
+    contact_updates = 0   # counts changes to the structure of any population, so that caches of contacts can tell they are stale
+    symptom_register = None   # a population's SymptomRegister, told whenever this person's symptoms may have changed
+
     def __init__(self, name, config=None, home=None):
         set_config(self, config)
 
         self.isolation = None
+        self.periods = 0
         self.infectious = False
         self.time_since_infection = 0
         self.disease = None
@@ -46,6 +111,10 @@ class Person:
     def symptomatic(self):
         return self.infectious
 
+    def note_symptoms(self):
+        if self.symptom_register is not None:
+            self.symptom_register.update(self)
+
     @property
     def infected(self):
         return len(self.covid_experiences) > 0
@@ -64,6 +133,7 @@ class Person:
                 immunities[name] = max(value, immunities.get(name, 0.0))
 
         self.immunities = immunities
+        Person.immunity_updates += 1
 
     def succeptibility_to(self, disease):
         return 1. - self.immunities.get(str(disease), 0.)
@@ -80,7 +150,7 @@ class Person:
     def infectious_attack(self, other, days):
         succeptibility = other.succeptibility_to(self.disease)
         if succeptibility > 0:
-            if random.random() < self.disease.pr_transmit_per_day * days * succeptibility:
+            if STREAMS.transmission.random() < self.disease.pr_transmit_per_day * days * succeptibility:
                 other.set_infected(self.disease, infector=self)
                 self.victims.add(other.name)
 
@@ -90,13 +160,14 @@ class Person:
         self.update_immunities()
         self.infectious = True
         self.disease = disease
+        self.note_symptoms()
         if infector:
             self.chain_length = infector.chain_length + 1
             self.infectors.append(infector.name)
 
     def isolate(self):
         if self.isolation is None:
-            self.isolation = Isolation()
+            self.isolation = Isolation(self.periods)
 
     def leave_isolation(self):
         assert self.isolating
@@ -110,12 +181,15 @@ class Person:
         self.infectious = False
         self.disease = None
         self.time_since_infection = 0
+        self.note_symptoms()
 
     def update_time(self, society):
+        self.periods += 1
 
         if self.isolating:
-            self.isolation.update_time(self.episode_time)
-            self.consider_leaving_isolation(society)
+            if self.periods - self.isolation.start_period >= \
+                    periods_of_isolation(self.episode_time, self.cfg.DURATION_OF_ISOLATION):
+                self.consider_leaving_isolation(society)
 
         if self.disease is not None:
             self.time_since_infection += 1
@@ -127,8 +201,10 @@ class Person:
         return self.time_since_infection * self.episode_time
 
     def consider_leaving_isolation(self, society=None):
-        if self.isolation.days_elapsed > self.cfg.DURATION_OF_ISOLATION:
-            self.leave_isolation()
+        """
+        Called each period once more than DURATION_OF_ISOLATION days have elapsed in isolation
+        """
+        self.leave_isolation()
 
     def update_disease(self, days_since_infect, society=None):
         if days_since_infect == self.disease.days_infectious:
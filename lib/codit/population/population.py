@@ -1,7 +1,8 @@
-import random
+import logging
 from collections import defaultdict
-from codit.population.person import Person
-from codit.config import CFG
+from codit.population.person import Person, SymptomRegister
+from codit.config import CFG, set_config
+from codit.streams import STREAMS, seeded
 
 import numpy as np
 
@@ -11,11 +12,52 @@ class Population:
         person_type = person_type or Person
         self.census = {id: person_type(id, config=society.cfg.__dict__) for id in range(n_people)}
         self.people = self.census.values()
+        self.symptoms = SymptomRegister()
+        self.attacks_attempted = 0   # a count of the times an infectious person has met another
+        for person in self.people:
+            person.symptom_register = self.symptoms
         self.adopt_society(society)
+        self.note_structure()
+
+    def note_structure(self):
+        """
+        Note which attributes people have, now that they are built, and before any epidemic:
+        a reset keeps those it does not initialise afresh
+        """
+        self._structure = {name for person in self.people for name in person.__dict__}
 
     def reset_people(self, society):
+        """
+        Return everyone to the state in which a new person starts, keeping their place in the population's
+        structure (such as their home, age and contacts). The state is copied from one person initialised
+        afresh for each type of person, rather than initialising everyone, except that each person is given
+        their own config, as when a checkpoint is restored. Any other attribute a person has acquired since the
+        population was built is state which would otherwise leak from one run into the next: it is dropped,
+        with a warning.
+        """
+        self.symptoms.clear()
+        fresh_by_type = dict()
+        leaked = set()
         for person in self.people:
-            person.__init__(person.name, config=society.cfg.__dict__, home=person.home)
+            person_type = type(person)
+            if person_type not in fresh_by_type:
+                fresh, containers = fresh_state(person_type, society)
+                kept = [name for name in self._structure if name not in fresh]
+                fresh_by_type[person_type] = fresh, containers, kept, fresh.keys() | kept
+            fresh, containers, kept, known = fresh_by_type[person_type]
+            state = person.__dict__
+            if not state.keys() <= known:
+                leaked.update(state.keys() - known)
+            structure = {name: state[name] for name in kept if name in state}
+            state.clear()
+            state.update(fresh)
+            state.update(structure)
+            for name, value in containers:
+                state[name] = value.copy()
+            set_config(person, society.cfg.__dict__)
+        if leaked:
+            logging.warning(f"Dropped attributes {sorted(leaked)} which people acquired during an earlier run")
+        Person.immunity_updates += 1
 
     def adopt_society(self, society):
         society.census = self.census
@@ -26,7 +68,10 @@ class Population:
         for person in self.people:
             person.simplify_state()
 
-    def attack_in_groupings(self, group_size):
+    def attack_in_groupings(self, group_size, days=None):
+        """
+        :param days: the days over which the people of each group are together, by default one period of each infector's
+        """
         groups = self.form_groupings(group_size)
         for g in groups:
             g = (self.census[p] for p in g)
@@ -35,12 +80,22 @@ class Population:
                 continue
             for p1 in g:
                 if p1.infectious:
+                    self.attacks_attempted += len(g) - 1
+                    exposure = days or p1.episode_time
                     for p2 in g:
                         if p2 != p1:
-                            p1.infectious_attack(p2, days=p1.episode_time)
+                            p1.infectious_attack(p2, days=exposure)
+
+    def quiescent(self):
+        """
+        :return: whether attack_in_groupings would neither infect anyone nor draw any random numbers.
+        People mixing at random are grouped by random draws, so this is never the case.
+        """
+        return False
 
     def form_groupings(self, group_size):
-        return (random.sample(self.census.keys(), group_size) for _ in range(len(self.people)))
+        names = list(self.census)
+        return (STREAMS.encounters.sample(names, group_size) for _ in range(len(self.people)))
 
     def seed_infections(self, n_infected, diseases, society, seed_periods=None):
         seed_infection(n_infected, self.people, diseases, society, seed_periods=seed_periods)
@@ -61,6 +116,12 @@ class Population:
         for p in self.people:
             p.update_time(society)
 
+    def settled(self):
+        """
+        :return: whether nobody is infected and not yet recovered, and nobody is isolating
+        """
+        return not any(p.disease is not None or p.isolating for p in self.people)
+
     def victim_dict(self):
         """
         :return: a dictionary from infector to the tuple of people infected
@@ -77,6 +138,18 @@ class Population:
         return np.mean(n_victims)
 
 
+def fresh_state(person_type, society):
+    """
+    :return: the attributes of a new person of person_type in society, other than their name and home,
+    and a list of (name, value) of those which are containers, which each person needs their own copy of
+    """
+    person = person_type(None, config=society.cfg.__dict__)
+    person.adopt_society(society)
+    fresh = {name: value for name, value in person.__dict__.items() if name not in ('name', 'home')}
+    containers = [(name, value) for name, value in fresh.items() if isinstance(value, (list, set, dict))]
+    return fresh, containers
+
+
 def seed_infection(n_infected, people, diseases, society, seed_periods=None):
     if type(diseases) is not set:
         diseases = {diseases}
@@ -86,21 +159,59 @@ def seed_infection(n_infected, people, diseases, society, seed_periods=None):
     for d in diseases:
         seed_periods = seed_periods or d.days_infectious
         succeptibles = [p for p in people if p.succeptibility_to(d) > 0]
-        for p in random.sample(succeptibles, n_infected[str(d)]):
+        for p in STREAMS.seeding.sample(succeptibles, n_infected[str(d)]):
             p.set_infected(d)
-            stage = random.random() * seed_periods
+            stage = STREAMS.seeding.random() * seed_periods
             while p.disease and p.days_infected() < stage:
                 p.update_time(society)
 
 
 class FixedNetworkPopulation(Population):
-    def __init__(self, n_people, society, person_type=None):
-        Population.__init__(self, n_people, society, person_type=person_type)
-        self.set_structure(society)
+    def __init__(self, n_people, society, person_type=None, seed=None):
+        """
+        :param seed: an int or numpy.random.Generator from which to draw the network (see codit.streams),
+        or None to draw from the current streams
+        """
+        with seeded(seed):
+            Population.__init__(self, n_people, society, person_type=person_type)
+            self.set_structure(society)
 
     def set_structure(self, society, **kwargs):
         self.fixed_cliques = self.fix_cliques(society.encounter_size, **kwargs)
         self.contacts = self.find_contacts()
+        self.note_structure()
+        Person.contact_updates += 1
+        self._degrees = None
+        self._cohorts = dict()
+
+    @property
+    def degrees(self):
+        """
+        :return: an array of the number of contacts of each person, in the order of self.people
+        """
+        if self._degrees is None:
+            self._degrees = np.fromiter((len(p.contacts) for p in self.people), dtype=np.int64,
+                                        count=len(self.people))
+        return self._degrees
+
+    def degree_quantile(self, quantile):
+        """
+        :return: the degree of the person ranked int(quantile * n) out of n, from the least connected
+        """
+        idx = int(quantile * len(self.people))
+        return np.partition(self.degrees, idx - 1)[idx - 1]
+
+    def high_valency_people(self, threshold, inclusive=True):
+        """
+        :param inclusive: if True, then include people with exactly threshold contacts
+        :return: a list of the people with more than (or as many as) threshold contacts, in the order of self.people
+        """
+        key = (threshold, inclusive)
+        if key not in self._cohorts:
+            above = self.degrees >= threshold if inclusive else self.degrees > threshold
+            people = list(self.people)
+            self._cohorts[key] = [people[i] for i in np.flatnonzero(above)]
+        return self._cohorts[key]
 
     def find_contacts(self):
         d = defaultdict(set)
@@ -116,9 +227,15 @@ class FixedNetworkPopulation(Population):
         people = [p.name for p in people]
         # TODO: the int below rounds *down*
         n_groups = int((len(people) + 1) * mean_num_contacts / group_size)
-        ii_jj = [random.choices(people, k=n_groups) for _ in range(group_size)]
+        ii_jj = [STREAMS.structure.choices(people, k=n_groups) for _ in range(group_size)]
         return [set(g) for g in zip(*ii_jj) if len(set(g)) == group_size]
 
+    def quiescent(self):
+        """
+        :return: whether nobody is infectious, so that meeting the fixed cliques would change nothing
+        """
+        return not any(p.infectious for p in self.people)
+
     def form_groupings(self, group_size):
         """
         :param group_size: Does nothing in this method
@@ -0,0 +1,47 @@
+"""
+Where the time of a simulation goes: wall time and calls for each phase of a step, and for each recorder component,
+with counts of the work done
+"""
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class PhaseProfiler:
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def report(self):
+        """
+        :return: a dict with, for each phase, its total seconds, its calls and the mean seconds per call;
+        and the totals of each counter
+        """
+        phases = {name: dict(seconds=self.seconds[name], calls=self.calls[name],
+                             mean_seconds=self.seconds[name] / self.calls[name])
+                  for name in self.seconds}
+        return dict(phases=phases, counters=dict(self.counters))
+
+    def __str__(self):
+        total = sum(s for name, s in self.seconds.items() if '/' not in name)
+        lines = [f"{'phase':<40} {'seconds':>10} {'share':>7} {'calls':>8} {'ms/call':>9}"]
+        for name, s in sorted(self.seconds.items()):
+            lines.append(f"{name:<40} {s:>10.3f} {s / total if total else 0:>7.1%} {self.calls[name]:>8} "
+                         f"{1000 * s / self.calls[name]:>9.3f}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"{name:<40} {n:>10}")
+        return "\n".join(lines)
@@ -1,6 +1,7 @@
-import random
+import numpy as np
 
 from codit.society.basic import Society
+from codit.streams import STREAMS
 
 
 class TestingSociety(Society):
@@ -12,20 +13,21 @@ class TestingSociety(Society):
             self.add_test(person, notes)
 
     def overlook_test(self):
-        return (self.cfg.PROB_TEST_IF_REQUESTED < 1) and (random.random() >= self.cfg.PROB_TEST_IF_REQUESTED)
+        return (self.cfg.PROB_TEST_IF_REQUESTED < 1) and (STREAMS.society.random() >= self.cfg.PROB_TEST_IF_REQUESTED)
 
     def add_test(self, person, notes, front_of_queue=False):
-        q, = self.queues
-        q.add_test(person, notes, self.cfg.TEST_DAYS_ELAPSED, census=self.census, front_of_queue=front_of_queue)
+        self.scheduler.add_test(person, notes, front_of_queue=front_of_queue, census=self.census)
 
     def act_on_test(self, t, census):
         pass
 
     def remove_test(self, test, queue):
         queue.remove_test(test)
-        self.test_recorder.append(test.__dict__)
+        self.test_recorder.append(test)
 
     def remove_stale_test(self, person):
+        if not self.test_index.swabbed(person):
+            return
         for q in self.queues:
             for t in q.tests_of(person):
                 if t.days_elapsed > person.cfg.DURATION_OF_ISOLATION:
@@ -33,10 +35,7 @@ class TestingSociety(Society):
                     continue
 
     def currently_testing(self, person):
-        for q in self.queues:
-            if len(list(q.tests_of(person))) > 0:
-                return True
-        return False
+        return self.test_index.swabbed(person) > 0
 
     def manage_outbreak(self, population, max_processed=None):
         for q in self.queues:
@@ -56,19 +55,67 @@ class TestingSociety(Society):
                 self.act_on_test(r_test, census)
 
     def set_actionable_tests(self, max_processed):
-        for q in self.queues:
-            q.completed_tests = q.pick_actionable_tests(max_processed)
+        self.scheduler.allocate(max_processed)
+
+
+def first_appearances(names):
+    """
+    :return: the distinct names, in the order they first appear, and how often each appears
+    """
+    distinct, first, counts = np.unique(names, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    return distinct[order].tolist(), counts[order].tolist()
 
 
 class TestingTracingSociety(TestingSociety):
 
+    # if True, then the contacts of all a period's positive tests are traced together, drawing their chances
+    # as arrays. This changes the sequence of random draws, so runs are no longer comparable with serial tracing.
+    BATCH_TRACING = False
+
+    def act_on_tests(self, census):
+        self.index_cases = []
+        TestingSociety.act_on_tests(self, census)
+        if self.index_cases:
+            self.trace_index_cases(self.index_cases, census)
+
+    def trace_index_cases(self, index_cases, census):
+        """
+        Trace the contacts of many positive index cases at once
+        :param index_cases: a list of (person, test_contacts) with test_contacts as in act_on_test
+        """
+        people, test_contacts = zip(*index_cases)
+        contacts, owners = self.contact_counts.contacts_of(people, census)
+        traced = STREAMS.society.np.random(len(contacts)) < self.cfg.PROB_TRACING_GIVEN_CONTACT
+        self.contacts_traced += int(traced.sum())
+        self.respond_to_tracing(contacts[traced], np.array(test_contacts, dtype=bool)[owners[traced]], census)
+
+    def respond_to_tracing(self, contacts, test_contacts, census):
+        """
+        :param contacts: array of the names of traced contacts, one for each index case by whom they were traced
+        :param test_contacts: boolean array, whether each tracing asks the contact to get a test
+        Each contact is screened once, and isolates if any of their tracings persuades them to,
+        which is as likely as it is when index cases are traced one by one
+        """
+        names, _ = first_appearances(contacts)
+        to_test = set(contacts[test_contacts].tolist())
+        for id in names:
+            self.screen_contact_for_testing(census[id], do_test=id in to_test)
+        isolating = STREAMS.society.np.random(len(contacts)) < self.cfg.PROB_ISOLATE_IF_TRACED
+        for id in first_appearances(contacts[isolating])[0]:
+            census[id].isolate()
+
     def act_on_test(self, test, census=None, test_contacts=False):
         if test.positive:
+            if self.BATCH_TRACING:
+                self.index_cases.append((test.person, test_contacts))
+                return
             for id in test.person.contacts:
-                if random.random() < self.cfg.PROB_TRACING_GIVEN_CONTACT:
+                if STREAMS.society.random() < self.cfg.PROB_TRACING_GIVEN_CONTACT:
+                    self.contacts_traced += 1
                     c = census[id]
                     self.screen_contact_for_testing(c, do_test=test_contacts)
-                    if random.random() < self.cfg.PROB_ISOLATE_IF_TRACED:
+                    if STREAMS.society.random() < self.cfg.PROB_ISOLATE_IF_TRACED:
                         c.isolate()
 
     def screen_contact_for_testing(self, c, do_test=True):
@@ -98,11 +145,10 @@ class ContactDoubleTestingSociety(UKSociety):
         ContactTestingSociety.act_on_test(self, test, census=census)
 
         if not test.positive and test.notes == 'contact':
-            if random.random() < self.cfg.PROB_ISOLATE_IF_TRACED:
+            if STREAMS.society.random() < self.cfg.PROB_ISOLATE_IF_TRACED:
                 test.person.isolate()
                 if not self.currently_testing(test.person):
-                    q, = self.queues
-                    q.add_test(test.person, 'contact two', self.cfg.TEST_DAYS_ELAPSED, days_delayed_start=3)
+                    self.scheduler.add_test(test.person, 'contact two', days_delayed_start=3)
 
 
 class HighValencyTester(ContactDoubleTestingSociety):
@@ -114,18 +160,18 @@ class HighValencyTester(ContactDoubleTestingSociety):
         self.handle_high_valencies(population)
         ContactDoubleTestingSociety.manage_outbreak(self, population)
 
+    def idle(self):
+        return False   # the people of high valency are tested regularly, whatever happens
+
     def handle_high_valencies(self, population):
-        for person in population.people:
-            if len(person.contacts) >= self.GENERAL_VALENCY_THRESHOLD:
-                self.handle_connected_person(person)
+        for person in population.high_valency_people(self.GENERAL_VALENCY_THRESHOLD):
+            self.handle_connected_person(person)
 
     def handle_connected_person(self, person):
         if not self.currently_testing(person):
-            q = self.queues[0]
-            # add the test to the first queue (of 1!) (later we will make this the high-priority queue)
+            q = self.scheduler.queue(self.scheduler.route('valency'))
             if not (q.contains_planned_test_of(person)):
-                q.add_test(person, 'valency', self.cfg.TEST_DAYS_ELAPSED,
-                           days_delayed_start=self.VALENCY_TEST_FREQUENCY_DAYS)
+                self.scheduler.add_test(person, 'valency', days_delayed_start=self.VALENCY_TEST_FREQUENCY_DAYS)
 
 
 class HighValencyIsolator(HighValencyTester):
@@ -1,5 +1,7 @@
 from codit.config import set_config
-from codit.society.test import TestQueue
+from codit.society.test import TestQueue, TestIndex, SusceptibleContactCounts
+from codit.society.records import TestRecorder
+from codit.society.scheduler import TestScheduler, QueueSpec
 
 class Society:
     def __init__(self, census=None, episodes_per_day=None, encounter_size=None, prob_unnecessary_worry=0, config=None):
@@ -8,11 +10,15 @@ class Society:
             prob_unnecessary_worry = self.cfg.PROB_NON_C19_SYMPTOMS_PER_DAY
         self.episodes_per_day = episodes_per_day or self.cfg.SIMULATOR_PERIODS_PER_DAY
         assert type(self.episodes_per_day) == int
+        self.daily_transmission = self.cfg.SIMULATOR_DAILY_TRANSMISSION
         self.encounter_size = encounter_size or self.cfg.MEAN_NETWORK_SIZE
         self.prob_worry = prob_unnecessary_worry / self.episodes_per_day
-        self.queues = [TestQueue()]
-        self.test_recorder = []
+        self.test_index = TestIndex()
+        self.contact_counts = SusceptibleContactCounts()
+        self.declare_queues([QueueSpec('main')])
+        self.test_recorder = TestRecorder()
         self.census = census
+        self.contacts_traced = 0   # a count of the contacts this society has traced, since its queues were cleared
 
     def manage_outbreak(self, population):
         pass
@@ -26,12 +32,35 @@ class Society:
     def currently_testing(self, person):
         return False
 
+    def idle(self):
+        """
+        :return: whether this society will do nothing further unless prompted by the epidemic:
+        it holds no tests, and nobody worries about symptoms which are not of covid
+        """
+        return self.prob_worry == 0 and len(self.test_index) == 0
+
+    def declare_queues(self, specs, policy=None):
+        """
+        :param specs: a list of scheduler.QueueSpec, one for each queue of tests
+        :param policy: how the queues share testing capacity, by default scheduler.StrictPriority
+        """
+        self.scheduler = TestScheduler(self, specs, policy=policy)
+        self.queues = self.scheduler.queues
+
+    def new_queue(self, test_type=None):
+        """
+        :return: a TestQueue sharing this society's per-person index of tests, and its counts of susceptible contacts
+        """
+        return TestQueue(test_type=test_type, index=self.test_index, contact_counts=self.contact_counts)
+
     def clear_queues(self):
+        self.test_index.clear()
+        self.contact_counts = SusceptibleContactCounts()
+        self.contacts_traced = 0
         for q in self.queues:
-            q.__init__(test_type=q.test_type)
+            q.__init__(test_type=q.test_type, index=self.test_index, contact_counts=self.contact_counts)
 
 class DraconianSociety(Society):
     def manage_outbreak(self, population):
-        for person in population.people:
-            if person.symptomatic:
-                person.isolate()
+        for person in population.symptoms.people:
+            person.isolate()
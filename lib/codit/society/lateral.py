@@ -1,13 +1,13 @@
-from codit.society import UKSociety
-from codit.society.test import TestQueue, LateralFlowTest
-import random
+from codit.society import UKSociety, first_appearances
+from codit.society.test import LateralFlowTest
+from codit.society.scheduler import QueueSpec, WeightedShare
 import logging
-from numpy.random import exponential as exp_dis
+from codit.streams import STREAMS
 
 
 def coopt_existing_test(track, notes, person):
     if notes[0] == 'contact':
-        for test in track._tests_of[person]:
+        for test in track._tests_of.get(person, ()):
             if test.notes[0] == 'contact' and (notes[1] < test.notes[1]):
                 test.notes = notes
                 return True
@@ -23,18 +23,27 @@ class LateralFlowUK(UKSociety):
 
     def __init__(self, **kwargs):
         UKSociety.__init__(self, **kwargs)
-        self.fast_track = TestQueue(test_type=LateralFlowTest)
-        self.slow_track = TestQueue()
-        self.queues = (self.fast_track, self.slow_track)
+        self.declare_queues([QueueSpec('fast_track', test_type=LateralFlowTest,
+                                       turnaround=0.02,   # about half an hour
+                                       share=lambda society: society.LATERAL_TO_PCR_RATIO),
+                             QueueSpec('slow_track',
+                                       turnaround=lambda cfg: STREAMS.society.np.exponential(cfg.TEST_DAYS_ELAPSED),
+                                       share=1)],
+                            policy=WeightedShare())
+        self.fast_track, self.slow_track = self.queues
         self.valency_threshold = None
         logging.info(f"The city has {self.LATERAL_TO_PCR_RATIO}x the number of lateral flow tests available, as PCRs")
 
     def act_on_test(self, test, census=None, n_reps_lateral_test=1):
         if test.positive:
+            if self.BATCH_TRACING:
+                self.index_cases.append((test.person, True))
+                return
             for id in test.person.contacts:
-                if random.random() < self.cfg.PROB_TRACING_GIVEN_CONTACT:
+                if STREAMS.society.random() < self.cfg.PROB_TRACING_GIVEN_CONTACT:
+                    self.contacts_traced += 1
                     c = census[id]
-                    if random.random() < self.cfg.PROB_GET_TEST_IF_TRACED:
+                    if STREAMS.society.random() < self.cfg.PROB_GET_TEST_IF_TRACED:
                         self.get_test_request(c, notes=('contact', 1), lateral_flow=True, census=census)
             return
 
@@ -48,7 +57,17 @@ class LateralFlowUK(UKSociety):
                                   lateral_flow=True,
                                   days_delayed_start=self.DAYS_BETWEEN_REPEATED_TESTS)
 
-    def get_test_request(self, person, notes=None, lateral_flow=False, days_delayed_start=0, census=None):
+    def respond_to_tracing(self, contacts, test_contacts, census):
+        asked = contacts[STREAMS.society.np.random(len(contacts)) < self.cfg.PROB_GET_TEST_IF_TRACED]
+        for id, requests in zip(*first_appearances(asked)):
+            self.get_test_request(census[id], notes=('contact', 1), lateral_flow=True, census=census,
+                                  requests=requests)
+
+    def get_test_request(self, person, notes=None, lateral_flow=False, days_delayed_start=0, census=None,
+                         requests=1):
+        """
+        :param requests: the number of times this same request is being made at once (by batched tracing)
+        """
 
         if person.has_tested_positive and not self.RETEST_POSITIVE_CASES:
             return
@@ -56,56 +75,49 @@ class LateralFlowUK(UKSociety):
         if person.has_tested_positive and person.isolating:
             return
 
-        if self.overlook_test():
+        # each request may be overlooked, just as if it were made on its own
+        requests = sum(not self.overlook_test() for _ in range(requests))
+        if not requests:
             return
 
-        track = self.fast_track
-        processing_days = 0.02   # about half an hour
-        if not lateral_flow:
-            track = self.slow_track
-            processing_days = exp_dis(self.cfg.TEST_DAYS_ELAPSED)
+        name = 'fast_track' if lateral_flow else 'slow_track'
+        track = self.scheduler.queue(name)
+        processing_days = self.scheduler.turnaround(name)
 
         if coopt_existing_test(track, notes, person):
-            return
+            # a repeat of this request would then find the test already there, but still consider isolating
+            requests -= 1
+            if not requests:
+                return
 
         track.add_test(person, notes, processing_days, False, days_delayed_start, census=census)
 
         if lateral_flow and (days_delayed_start == 0):
             # isolate for the (normally) short period while they get the first test result
-            if random.random() < self.cfg.PROB_ISOLATE_IF_TRACED:
+            if any(STREAMS.society.random() < self.cfg.PROB_ISOLATE_IF_TRACED for _ in range(requests)):
                 person.isolate()
 
     def add_test(self, person, notes, front_of_queue=False):
         raise NotImplementedError
 
-    def set_actionable_tests(self, max_processed):
-        fast_max = int(max_processed * self.LATERAL_TO_PCR_RATIO)
-        self.fast_track.completed_tests = self.fast_track.pick_actionable_tests(fast_max)
-
-        slow_max = fast_max - len(self.fast_track.completed_tests) + max_processed
-        self.slow_track.completed_tests = self.slow_track.pick_actionable_tests(slow_max)
-
     def manage_outbreak(self, population, max_days_wait_for_lateral=2):
 
         if self.valency_threshold is None:
             self.set_valency_threshold(population)
 
-        for person in population.people:
+        self.fast_track.expire_planned_tests(max_days_wait_for_lateral)
 
-            for test in self.fast_track.contains_planned_test_of(person):
-                if test.days_elapsed > max_days_wait_for_lateral:
-                    self.fast_track.remove_test(test)
-
-            if len(person.contacts) > self.valency_threshold:
-                self.handle_connected_person(person)
+        for person in population.high_valency_people(self.valency_threshold, inclusive=False):
+            self.handle_connected_person(person)
 
         UKSociety.manage_outbreak(self, population)
 
+    def idle(self):
+        return False   # the people of high valency are tested regularly, whatever happens
+
     def set_valency_threshold(self, population):
-        degrees = sorted(population.contacts.values(), key=len)
-        idx = int(self.GENERAL_VALENCY_QUANTILE_THRESHOLD * len(population.people))
-        self.valency_threshold = len(degrees[idx - 1])
-        logging.info(f"Setting mass testing valency/degree limit to {len(degrees[idx - 1])}")
+        self.valency_threshold = int(population.degree_quantile(self.GENERAL_VALENCY_QUANTILE_THRESHOLD))
+        logging.info(f"Setting mass testing valency/degree limit to {self.valency_threshold}")
 
     def handle_connected_person(self, person):
         if not self.currently_testing(person):
@@ -113,4 +125,4 @@ class LateralFlowUK(UKSociety):
                 self.get_test_request(person,
                                       notes='valency',
                                       lateral_flow=True,
-                                      days_delayed_start=exp_dis(self.VALENCY_TEST_FREQUENCY_DAYS))
+                                      days_delayed_start=STREAMS.society.np.exponential(self.VALENCY_TEST_FREQUENCY_DAYS))
@@ -0,0 +1,152 @@
+"""
+A columnar record of the tests a society has completed, for analysis once a simulation has run
+"""
+
+import os
+import numpy as np
+
+# name, dtype, and the value recorded when there is none
+COLUMNS = [('person', np.int64, -1),
+           ('notes', np.int16, -1),
+           ('positive', np.bool_, False),
+           ('days_elapsed', np.float32, np.nan),
+           ('_days_infected', np.float32, np.nan),
+           ('_isolating', np.bool_, False),
+           ('_disease', np.int16, -1),
+           ('_succeptible_contacts', np.float32, np.nan),
+           ('_succeptible_contacts_of_contacts', np.float32, np.nan),
+           ('contacts', np.int32, -1),
+           ('income_decile', np.int8, -1)]
+CATEGORICAL = {'notes', '_disease'}
+
+
+def income_decile(person):
+    """
+    :return: the income decile of the LSOA where the person lives, or None if this is not known
+    """
+    try:
+        return int(person.home.lsoa.features['Income_Decile'])
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+class TestRecorder:
+    """
+    Typed column buffers holding, for each test removed from a queue, what was known when it was taken.
+    Unlike the test objects themselves, these hold no references to people, so memory grows by about 40 bytes a test.
+    Person ids are the keys of the census. Notes and diseases are held as codes into the lists self.vocabulary[name].
+    """
+    def __init__(self, capacity=1024, spill_path=None, spill_rows=1 << 20):
+        """
+        :param capacity: the number of rows for which space is first set aside
+        :param spill_path: if given, then each time spill_rows tests have been recorded,
+        they are written to the file spill_path.<n>.npz and dropped from memory
+        """
+        self.spill_path = spill_path
+        self.spill_rows = spill_rows
+        self.vocabulary = {name: [] for name in CATEGORICAL}
+        self._codes = {name: dict() for name in CATEGORICAL}
+        self.spilled = []
+        self.n_spilled = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.n = 0
+        self.columns = {name: np.full(capacity, missing, dtype=dtype) for name, dtype, missing in COLUMNS}
+
+    def __len__(self):
+        return self.n_spilled + self.n
+
+    def code(self, name, value):
+        codes = self._codes[name]
+        if value not in codes:
+            codes[value] = len(self.vocabulary[name])
+            self.vocabulary[name].append(value)
+        return codes[value]
+
+    def append(self, test):
+        if self.n == len(self.columns['person']):
+            if self.spill_path and self.n >= self.spill_rows:
+                self.spill()
+            else:
+                self._grow()
+        row = self.n
+        c = self.columns
+        person = test.person
+        c['person'][row] = person.name
+        c['notes'][row] = self.code('notes', test.notes)
+        c['positive'][row] = bool(test.positive)
+        c['days_elapsed'][row] = test.days_elapsed
+        if test._days_infected is not None:
+            c['_days_infected'][row] = test._days_infected
+        c['_isolating'][row] = test._isolating
+        c['_disease'][row] = self.code('_disease', test._disease)
+        if hasattr(test, '_succeptible_contacts'):
+            c['_succeptible_contacts'][row] = test._succeptible_contacts
+            c['_succeptible_contacts_of_contacts'][row] = test._succeptible_contacts_of_contacts
+        if hasattr(person, 'contacts'):
+            c['contacts'][row] = len(person.contacts)
+        decile = income_decile(person)
+        if decile is not None:
+            c['income_decile'][row] = decile
+        self.n += 1
+
+    def _grow(self):
+        for name, dtype, missing in COLUMNS:
+            column = self.columns[name]
+            grown = np.full(2 * len(column), missing, dtype=dtype)
+            grown[:len(column)] = column
+            self.columns[name] = grown
+
+    def spill(self):
+        path = f"{self.spill_path}.{len(self.spilled):05d}.npz"
+        np.savez(path, **self.arrays())
+        self.spilled.append(path)
+        self.n_spilled += self.n
+        self._allocate(len(self.columns['person']))
+
+    def arrays(self):
+        """
+        :return: a dict of arrays, one for each column, over the tests held in memory. These are views, not copies.
+        """
+        return {name: column[:self.n] for name, column in self.columns.items()}
+
+    def all_arrays(self):
+        """
+        :return: a dict of arrays, one for each column, over every test recorded including any spilled to disk
+        """
+        if not self.spilled:
+            return self.arrays()
+        chunks = [np.load(path) for path in self.spilled] + [self.arrays()]
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name, _, _ in COLUMNS}
+
+    def to_dataframe(self):
+        """
+        :return: a pandas.DataFrame with a row for each test. Unless tests have been spilled to disk,
+        its numerical columns share memory with this recorder, and notes and diseases are categoricals over its codes.
+        """
+        import pandas as pd
+        data = dict()
+        for name, column in self.all_arrays().items():
+            if name in CATEGORICAL:
+                categories = pd.Index(self.vocabulary[name], dtype=object, tupleize_cols=False)
+                column = pd.Categorical.from_codes(column, categories=categories)
+            data[name] = column
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        """
+        :return: a pyarrow.Table with a row for each test (this needs pyarrow to be installed)
+        """
+        import pyarrow as pa
+        data = dict()
+        for name, column in self.all_arrays().items():
+            if name in CATEGORICAL:
+                column = pa.DictionaryArray.from_arrays(column, pa.array([str(v) for v in self.vocabulary[name]]))
+            data[name] = column
+        return pa.table(data)
+
+    def clear(self):
+        for path in self.spilled:
+            os.remove(path)
+        self.__init__(spill_path=self.spill_path, spill_rows=self.spill_rows)
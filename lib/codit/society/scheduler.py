@@ -0,0 +1,135 @@
+"""
+Test queues declared by a society, and policies for sharing its testing capacity between them
+"""
+
+import heapq
+
+
+class QueueSpec:
+    def __init__(self, name, test_type=None, turnaround=None, priority=None, share=None, notes=None):
+        """
+        :param name: string naming the queue, eg 'fast_track'
+        :param test_type: the class of the tests in this queue
+        :param turnaround: the days a test takes to process once swabbed: a number, or a function of the society's cfg
+        returning a (possibly random) number of days, or None for cfg.TEST_DAYS_ELAPSED
+        :param priority: queues are offered capacity in increasing order of priority, and by default in the order declared
+        :param share: for WeightedShare, the proportion of capacity set aside for this queue: a number,
+        or a function of the society returning one, or None for whatever capacity the queues before it were not allotted
+        :param notes: the notes of the tests which TestScheduler.add_test routes to this queue: a collection of notes,
+        or a function of the notes returning whether to take the test, or None for any test
+        """
+        self.name = name
+        self.test_type = test_type
+        self.turnaround = turnaround
+        self.priority = priority
+        self.share = share
+        self.notes = notes
+
+    def takes(self, notes):
+        if self.notes is None:
+            return True
+        if callable(self.notes):
+            return self.notes(notes)
+        return notes in self.notes
+
+    def __repr__(self):
+        return f"QueueSpec <{self.name}>"
+
+
+class StrictPriority:
+    """
+    Each queue in turn processes as many of its tests as it can, and leaves what capacity remains to the next
+    """
+    def allocate(self, scheduler, max_processed):
+        for q in scheduler.by_priority:
+            q.completed_tests = q.pick_actionable_tests(max_processed)
+            if max_processed is not None:
+                max_processed -= len(q.completed_tests)
+
+
+class WeightedShare:
+    """
+    Each queue is allotted its share of capacity, plus whatever the queues before it did not use
+    """
+    def allocate(self, scheduler, max_processed):
+        if max_processed is None:
+            return StrictPriority().allocate(scheduler, max_processed)
+        allotted = 0
+        unused = 0
+        for q, spec in zip(scheduler.by_priority, scheduler.specs_by_priority):
+            share = spec.share(scheduler.society) if callable(spec.share) else spec.share
+            allotment = int(max_processed * share) if share is not None else max(max_processed - allotted, 0)
+            allotted += allotment
+            q.completed_tests = q.pick_actionable_tests(allotment + unused)
+            unused += allotment - len(q.completed_tests)
+
+
+class DeadlineFirst:
+    """
+    Capacity goes to the completed tests which have waited longest for their results, whichever queue they are in
+    """
+    def allocate(self, scheduler, max_processed):
+        due = [[(entry[0], entry[1], i, entry[2]) for entry in q.due_tests()] for i, q in enumerate(scheduler.queues)]
+        picked = [[] for _ in scheduler.queues]
+        for n, (_, _, i, test) in enumerate(heapq.merge(*due, key=lambda e: e[:3])):
+            if max_processed is not None and n >= max_processed:
+                break
+            picked[i].append(test)
+        for q, tests in zip(scheduler.queues, picked):
+            q.completed_tests = tests
+
+
+class TestScheduler:
+    """
+    The queues of a society, in the order declared, and the policy by which they share its testing capacity
+    """
+    def __init__(self, society, specs, policy=None):
+        self.society = society
+        self.specs = list(specs)
+        self.policy = policy or StrictPriority()
+        self.queues = tuple(society.new_queue(test_type=spec.test_type) for spec in self.specs)
+        self._queue = {spec.name: q for spec, q in zip(self.specs, self.queues)}
+        self._spec = {spec.name: spec for spec in self.specs}
+        order = sorted(range(len(self.specs)),
+                       key=lambda i: (self.specs[i].priority if self.specs[i].priority is not None else i, i))
+        self.by_priority = [self.queues[i] for i in order]
+        self.specs_by_priority = [self.specs[i] for i in order]
+
+    def queue(self, name):
+        return self._queue[name]
+
+    def turnaround(self, name):
+        """
+        :return: the days a test in the named queue will take to process, once swabbed
+        """
+        turnaround = self._spec[name].turnaround
+        if turnaround is None:
+            return self.society.cfg.TEST_DAYS_ELAPSED
+        if callable(turnaround):
+            return turnaround(self.society.cfg)
+        return turnaround
+
+    def route(self, notes):
+        """
+        :return: the name of the first queue declared which takes tests with these notes, or else of the first queue
+        """
+        for spec in self.specs:
+            if spec.takes(notes):
+                return spec.name
+        return self.specs[0].name
+
+    def add_test(self, person, notes, front_of_queue=False, days_delayed_start=0, census=None):
+        """
+        Add a test of the person to the queue to which its notes are routed, taking that queue's turnaround
+        :return: the name of that queue
+        """
+        name = self.route(notes)
+        self._queue[name].add_test(person, notes, self.turnaround(name), front_of_queue, days_delayed_start,
+                                   census=census)
+        return name
+
+    def allocate(self, max_processed):
+        """
+        Set the completed_tests of each queue, processing no more than max_processed tests in all (None for no limit)
+        """
+        self.policy.allocate(self, max_processed)
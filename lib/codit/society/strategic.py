@@ -1,6 +1,6 @@
 from codit.society import UKSociety, HighValencyTester
-from codit.society.test import TestQueue
-import random
+from codit.society.scheduler import QueueSpec, WeightedShare
+from codit.streams import STREAMS
 
 
 class TwoTrackTester(UKSociety):
@@ -12,15 +12,16 @@ class TwoTrackTester(UKSociety):
 
     def __init__(self, **kwargs):
         UKSociety.__init__(self, **kwargs)
-        self.fast_track = TestQueue()
-        self.slow_track = TestQueue()
-        self.queues = (self.fast_track, self.slow_track)
+        self.declare_queues([QueueSpec('fast_track', share=lambda society: society.PROPORTION_FAST_TRACK),
+                             QueueSpec('slow_track')],
+                            policy=WeightedShare())
+        self.fast_track, self.slow_track = self.queues
 
     def act_on_test(self, test, census=None, test_contacts=False):
         UKSociety.act_on_test(self, test, census=census, test_contacts=True)
 
         if not test.positive and test.notes == 'contact':
-            if random.random() < self.cfg.PROB_ISOLATE_IF_TRACED:
+            if STREAMS.society.random() < self.cfg.PROB_ISOLATE_IF_TRACED:
                 test.person.isolate()
                 self.get_test_request(test.person, notes='contact part two',
                                       priority=True, days_delayed_start=self.DAYS_TO_CONTACTS_SECOND_TEST)
@@ -34,24 +35,15 @@ class TwoTrackTester(UKSociety):
         if len(person.contacts) < self.MIN_CONTACTS_TEST:
             return
 
-        if random.random() < self.cfg.PROB_TEST_IF_REQUESTED:
+        if STREAMS.society.random() < self.cfg.PROB_TEST_IF_REQUESTED:
             if not self.currently_testing(person):
-                args = (person, notes, self.cfg.TEST_DAYS_ELAPSED, False, days_delayed_start)
-                if priority:
-                    self.fast_track.add_test(*args)
-                else:
-                    self.slow_track.add_test(*args)
+                track = 'fast_track' if priority else 'slow_track'
+                self.scheduler.queue(track).add_test(person, notes, self.scheduler.turnaround(track), False,
+                                                     days_delayed_start)
 
     def add_test(self, person, notes, front_of_queue=False):
         raise NotImplementedError
 
-    def set_actionable_tests(self, max_processed):
-        fast_max = int(max_processed * self.PROPORTION_FAST_TRACK)
-        self.fast_track.completed_tests = self.fast_track.pick_actionable_tests(fast_max)
-
-        slow_max = max_processed - len(self.fast_track.completed_tests)
-        self.slow_track.completed_tests = self.slow_track.pick_actionable_tests(slow_max)
-
 
 class TwoTrackTesterofSymptoms(TwoTrackTester):
 
@@ -76,8 +68,11 @@ class TwoTrackSystem(TwoTrackTesterofSymptoms):
         HighValencyTester.handle_high_valencies(self, population)
         UKSociety.manage_outbreak(self, population)
 
+    def idle(self):
+        return False   # the people of high valency are tested regularly, whatever happens
+
     def handle_connected_person(self, person):
         if not self.currently_testing(person):
             if not self.fast_track.contains_planned_test_of(person):
-                self.fast_track.add_test(person, 'valency', self.cfg.TEST_DAYS_ELAPSED,
+                self.fast_track.add_test(person, 'valency', self.scheduler.turnaround('fast_track'),
                                          days_delayed_start=self.VALENCY_TEST_FREQUENCY_DAYS)
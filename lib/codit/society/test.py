@@ -1,38 +1,182 @@
+import heapq
+import itertools
 import logging
+import math
+from bisect import bisect_left, bisect_right, insort
 from collections import defaultdict
-import random
+
+import numpy as np
+
+from codit.population.person import Person
+from codit.streams import STREAMS
+
+
+class QueueClock:
+    """
+    Counts the periods through which a TestQueue has been updated, and the days elapsed over them
+    """
+    def __init__(self):
+        self.step = 0
+        self.timedelta = None
+        # _elapsed[n] is the days elapsed over n periods, summed just as each test once summed its own days_elapsed
+        self._elapsed = [0.]
+
+    def set_timedelta(self, timedelta):
+        if self.timedelta is None:
+            self.timedelta = timedelta
+        assert timedelta == self.timedelta, "a TestQueue must be updated by the same timedelta each period"
+
+    def tick(self):
+        self.step += 1
+        while len(self._elapsed) <= self.step:
+            self._extend()
+
+    def _extend(self):
+        self._elapsed.append(self._elapsed[-1] + self.timedelta)
+
+    def days_since(self, step):
+        return self._elapsed[self.step - step]
+
+    def days_over(self, periods):
+        while len(self._elapsed) <= periods:
+            self._extend()
+        return self._elapsed[periods]
+
+    def periods_until(self, days):
+        """
+        :return: the fewest periods over which at least this many days have elapsed
+        """
+        while self._elapsed[-1] < days:
+            self._extend()
+        return bisect_left(self._elapsed, days)
+
+    def periods_beyond(self, days):
+        """
+        :return: the fewest periods over which more than this many days have elapsed
+        """
+        while self._elapsed[-1] <= days:
+            self._extend()
+        return bisect_right(self._elapsed, days)
+
+
+class DaysElapsed:
+    """
+    The days since a test joined its queue, read off the queue's clock rather than being counted by each test.
+    Assigning to a test's days_elapsed (as the queue does when the test leaves) fixes its value from then on.
+    """
+    def __get__(self, test, owner=None):
+        if test is None:
+            return self
+        clock = getattr(test, '_clock', None)
+        return clock.days_since(test._start_step) if clock else 0
+
+
+def count_susceptible_contacts(person, census):
+    """
+    :return: (susceptible contacts, susceptible contacts of those contacts) of the person, walking the census
+    """
+    targets = [census[q] for q in person.contacts if not census[q].immunities]
+    return len(targets), len([census[s] for v in targets for s in v.contacts if not census[s].immunities])
+
+
+class SusceptibleContactCounts:
+    """
+    For everyone in a census, the number of their contacts with no immunities, and the number of those contacts'
+    contacts with no immunities (counted with multiplicity). Both are found for everyone at once, as sparse
+    matrix-vector products over the contact graph.
+    Once anyone's immunities change, these go stale: then people are counted one by one by walking the census,
+    until that has cost as much as counting everyone afresh, which is done next. So a burst of tests while
+    immunities are changing (as while infections are seeded) costs no more than twice what it once did.
+    The same sparse contact graph serves to trace the contacts of many people at once. It is built afresh
+    whenever the census, or the structure of any population (and so perhaps people's contacts), changes.
+    """
+    def __init__(self):
+        self.census = None
+        self.contact_updates = None
+        self.counts = None
+        self.immunity_updates = None
+        self.walked = 0
+
+    def bind(self, census):
+        names = list(census)
+        self.names = names
+        self.position = {name: i for i, name in enumerate(names)}
+        rows = [i for i, name in enumerate(names) for _ in census[name].contacts]
+        cols = [self.position[c] for name in names for c in census[name].contacts]
+        import scipy.sparse   # only here, so that simulations which never count contacts need not import scipy
+        self.adjacency = scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                                                 shape=(len(names), len(names)))
+        self.census = census
+        self.contact_updates = Person.contact_updates
+        self.counts = None
+
+    def bind_if_stale(self, census):
+        if census is not self.census or self.contact_updates != Person.contact_updates:
+            self.bind(census)
+
+    def contacts_of(self, people, census):
+        """
+        :return: two arrays, giving each contact of each of these people: the contact's name,
+        and the index in people of the person whose contact they are
+        """
+        self.bind_if_stale(census)
+        rows = np.array([self.position[p.name] for p in people], dtype=np.int64)
+        starts = self.adjacency.indptr[rows]
+        lengths = self.adjacency.indptr[rows + 1] - starts
+        owners = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        columns = self.adjacency.indices[np.repeat(starts, lengths) + offsets]
+        return np.asarray(self.names)[columns], owners
+
+    def of(self, person, census):
+        """
+        :return: (susceptible contacts, susceptible contacts of those contacts) of the person
+        """
+        self.bind_if_stale(census)
+        if self.counts is not None and self.immunity_updates != Person.immunity_updates:
+            if self.walked < self.adjacency.nnz + len(census):
+                counts = count_susceptible_contacts(person, census)
+                self.walked += 1 + len(person.contacts) + counts[1]
+                return counts
+            self.counts = None
+        if self.counts is None:
+            self.immunity_updates = Person.immunity_updates
+            self.walked = 0
+            susceptible = np.fromiter((not p.immunities for p in census.values()), dtype=np.int64, count=len(census))
+            first = self.adjacency @ susceptible
+            self.counts = first, self.adjacency @ (susceptible * first)
+        i = self.position[person.name]
+        return int(self.counts[0][i]), int(self.counts[1][i])
+
 
 class Test:
-    def __init__(self, person, notes, time_to_complete, days_delayed_start=0, census=None):
-        self.days_elapsed = 0
+
+    days_elapsed = DaysElapsed()
+
+    def __init__(self, person, notes, time_to_complete, days_delayed_start=0, census=None, contact_counts=None):
+        """
+        :param census: if given, then record how many susceptible contacts, and contacts of contacts, the person has
+        :param contact_counts: a SusceptibleContactCounts from which to read those, rather than walking the census
+        """
         self.person = person
         self.positive = None
         self.days_to_complete = time_to_complete + days_delayed_start
         self.notes = notes
         self.days_delayed_start = days_delayed_start
-        if census:
-            targets = [census[q] for q in person.contacts if not census[q].immunities]
-            self._succeptible_contacts = len(targets)
-            self._succeptible_contacts_of_contacts = \
-                len([census[s] for v in targets for s in v.contacts if not census[s].immunities])
+        if census and contact_counts is not None:
+            self._succeptible_contacts, self._succeptible_contacts_of_contacts = contact_counts.of(person, census)
+        elif census:
+            self._succeptible_contacts, self._succeptible_contacts_of_contacts = \
+                count_susceptible_contacts(person, census)
         self._days_infected = person.days_infected() if person.disease else None
         self._isolating = person.isolating
         self._disease = str(person.disease or 'None')
         self.swab_taken = False
 
-    def update_time(self, timedelta):
-        if self.time_to_swab(timedelta):
-            assert not self.swab_taken
-            self.swab()
-        self.days_elapsed += timedelta
-
     def swab(self):
         self.positive = self.person.infectious
         self.swab_taken = True
 
-    def time_to_swab(self, timedelta):
-        return self.days_delayed_start + timedelta > self.days_elapsed >= self.days_delayed_start
-
 
 class LateralFlowTest(Test):
 
@@ -45,65 +189,232 @@ class LateralFlowTest(Test):
         self.swab_taken = True
 
     def reaction(self, infectious):
-        r = random.random()
+        r = STREAMS.tests.random()
         if infectious:
             return r < self.SENSITIVITY
         return r >= self.SPECIFICITY
 
 
+class TestIndex:
+    """
+    The numbers of swabbed and of planned tests of each person, across all the queues sharing this index
+    """
+    def __init__(self):
+        self._counts = dict()   # person -> [swabbed, planned]
+
+    def swabbed(self, person):
+        counts = self._counts.get(person)
+        return counts[0] if counts else 0
+
+    def planned(self, person):
+        counts = self._counts.get(person)
+        return counts[1] if counts else 0
+
+    def __contains__(self, person):
+        return person in self._counts
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add(self, person):
+        self._counts.setdefault(person, [0, 0])[1] += 1
+
+    def swab(self, person):
+        counts = self._counts[person]
+        counts[1] -= 1
+        counts[0] += 1
+
+    def remove(self, person, swab_taken):
+        counts = self._counts[person]
+        counts[0 if swab_taken else 1] -= 1
+        if counts == [0, 0]:
+            del self._counts[person]
+
+    def clear(self):
+        self._counts.clear()
+
+
 class TestQueue:
-    def __init__(self, test_type=None):
-        self._taken_and_planned = []
+    """
+    Tests in first-come first-served order (unless added to the front of the queue), whose swabs are taken once
+    their days_delayed_start have elapsed, and which complete once their days_to_complete have elapsed.
+    Rather than each test counting its own days, the queue keeps a clock. Planned tests wait in a calendar
+    keyed by the period in which they will be swabbed, and swabbed tests are filed twice: in a list kept in order
+    of their place in the queue, and in a heap by the period in which they will complete.
+    Removed tests are dropped from the calendar, list and heap lazily.
+    """
+    def __init__(self, test_type=None, index=None, contact_counts=None):
+        """
+        :param test_type: the class of the tests in this queue
+        :param index: a TestIndex shared with a society's other queues, or None for an index of this queue alone
+        :param contact_counts: a SusceptibleContactCounts shared with a society's other queues, or None
+        """
         self.completed_tests = []
+        self.index = index if index is not None else TestIndex()
+        self.contact_counts = contact_counts
         self._tests_of = defaultdict(list)
         self.test_type = test_type or Test
+        self.swabbed_count = 0
+        self._clock = QueueClock()
+        self._next_seq = 0
+        self._next_front_seq = -1
+        self._seq = dict()       # every test in the queue -> its place in the queue
+        self._planned = dict()   # tests not yet swabbed -> the step when they will be, None if not yet scheduled
+        self._unscheduled = []   # planned tests added since the last update
+        self._swab_calendar = defaultdict(list)
+        self._expiry_days = None
+        self._unexpiring = []    # planned tests added since the last call to expire_planned_tests
+        self._by_expiry = []     # heap of (step after which more than _expiry_days have elapsed, seq, test)
+        self._due_step = dict()  # swabbed tests -> the step by which they complete
+        self._by_seq = []        # (seq, test) for swabbed tests, in order of seq
+        self._by_due = []        # heap of (due step, seq, test) for swabbed tests
 
     @property
     def tests(self):
         """
         :return: for past reasons, this attribute only returns tests whose swabs have been taken
         """
-        return (t for t in self._taken_and_planned if t.swab_taken)
+        return (t for _, t in self._by_seq if t in self._seq)
 
     def remove_test(self, test):
-        self._taken_and_planned.remove(test)
-        self._tests_of[test.person].remove(test)
+        self._seq.pop(test)
+        if test.swab_taken:
+            self.swabbed_count -= 1
+            del self._due_step[test]
+        else:
+            del self._planned[test]
+        self.index.remove(test.person, test.swab_taken)
+        tests_of_person = self._tests_of[test.person]
+        tests_of_person.remove(test)
+        if not tests_of_person:
+            del self._tests_of[test.person]
+        test.days_elapsed = test.days_elapsed
+        del test._clock, test._start_step
+        if len(self._by_seq) > 2 * self.swabbed_count + 1000:
+            self._compact()
+
+    def _compact(self):
+        self._by_seq = [e for e in self._by_seq if e[-1] in self._seq]
+        self._by_due = [e for e in self._by_due if e[-1] in self._seq]
+        heapq.heapify(self._by_due)
 
     def add_test(self, person, notes, time_to_complete, front_of_queue=False, days_delayed_start=0, census=None):
 
-        if notes in [t.notes for t in self._tests_of[person]]:
+        if person in self.index and notes in [t.notes for t in self._tests_of.get(person, ())]:
             # then there's already a test being planned or processed in this queue with the same purpose as this one
             # do nothing ...
             return
 
-        test = self.test_type(person, notes, time_to_complete, days_delayed_start=days_delayed_start, census=census)
+        test = self.test_type(person, notes, time_to_complete, days_delayed_start=days_delayed_start, census=census,
+                              contact_counts=self.contact_counts)
+        test._clock = self._clock
+        test._start_step = self._clock.step
         if front_of_queue:
-            self._taken_and_planned.insert(0, test)
+            self._seq[test] = self._next_front_seq
+            self._next_front_seq -= 1
         else:
-            self._taken_and_planned.append(test)
+            self._seq[test] = self._next_seq
+            self._next_seq += 1
+        self._planned[test] = None
+        self._unscheduled.append(test)
+        self._unexpiring.append(test)
         self._tests_of[person].append(test)
+        self.index.add(person)
 
     def tests_of(self, person):
-        return [t for t in self._tests_of[person] if t.swab_taken]
+        return [t for t in self._tests_of.get(person, ()) if t.swab_taken]
 
     def contains_planned_test_of(self, person):
-        return [t for t in self._tests_of[person] if not t.swab_taken]
+        return [t for t in self._tests_of.get(person, ()) if not t.swab_taken]
 
     def pick_actionable_tests(self, max_processed, logging_overrun=None):
-        actionable_tests = []
-        tests = [t for t in self.tests]
-        for i, t in enumerate(tests):
-
-            if max_processed is not None and i >= max_processed:
-                if logging_overrun:
-                    logging.info(logging_overrun)
-                continue
+        """
+        :param max_processed: only the first max_processed swabbed tests in the queue may complete, or None for no limit
+        :return: those swabbed tests which have completed, in queue order
+        """
+        if max_processed is not None and self.swabbed_count > max_processed:
+            if logging_overrun:
+                logging.info(logging_overrun)
+            front = itertools.islice(self.tests, max_processed)
+            return [t for t in front if self._due_step[t] <= self._clock.step]
 
-            if t.days_elapsed >= t.days_to_complete:
-                actionable_tests.append(t)
+        return [t for _, _, t in sorted(self.due_tests(), key=lambda e: e[1])]
 
-        return actionable_tests
+    def due_tests(self):
+        """
+        :return: a list of (due step, place in the queue, test) for every swabbed test which has completed,
+        soonest due first
+        """
+        due = []
+        while self._by_due and self._by_due[0][0] <= self._clock.step:
+            entry = heapq.heappop(self._by_due)
+            if entry[-1] in self._seq:
+                due.append(entry)
+        for entry in due:
+            heapq.heappush(self._by_due, entry)
+        return due
 
     def update_tests(self, time_delta):
-        for t in self._taken_and_planned:
-            t.update_time(time_delta)
+        self._clock.set_timedelta(time_delta)
+        for t in self._unscheduled:
+            if t in self._planned:
+                step = self._swab_step(t)
+                self._planned[t] = step
+                if step < math.inf:
+                    self._swab_calendar[step].append(t)
+        self._unscheduled = []
+
+        swabbing = [t for t in self._swab_calendar.pop(self._clock.step, ()) if t in self._planned]
+        for t in sorted(swabbing, key=self._seq.get):
+            self._swab(t)
+        self._clock.tick()
+
+    def expire_planned_tests(self, max_days):
+        """
+        Remove those tests which have been waiting for their swab for more than max_days
+        :return: the tests removed
+        """
+        if max_days != self._expiry_days:
+            self._expiry_days = max_days
+            self._unexpiring = list(self._planned)
+            self._by_expiry = []
+        if self._clock.timedelta is None:
+            # no time has yet elapsed
+            return []
+
+        for t in self._unexpiring:
+            if t in self._planned:
+                expiry_step = t._start_step + self._clock.periods_beyond(max_days)
+                heapq.heappush(self._by_expiry, (expiry_step, self._seq[t], t))
+        self._unexpiring = []
+
+        expired = []
+        while self._by_expiry and self._by_expiry[0][0] <= self._clock.step:
+            t = heapq.heappop(self._by_expiry)[-1]
+            if t in self._planned:
+                self.remove_test(t)
+                expired.append(t)
+        return expired
+
+    def _swab_step(self, test):
+        """
+        :return: the step at which the test's swab is taken, being the first at which its days_delayed_start
+        have elapsed, or infinity if rounding skips it past that window
+        """
+        periods = self._clock.periods_until(test.days_delayed_start)
+        if test.days_delayed_start + self._clock.timedelta > self._clock.days_over(periods):
+            return test._start_step + periods
+        return math.inf
+
+    def _swab(self, test):
+        test.swab()
+        del self._planned[test]
+        self.index.swab(test.person)
+        self.swabbed_count += 1
+        seq = self._seq[test]
+        periods_to_complete = max(self._clock.periods_until(test.days_to_complete),
+                                  self._clock.step - test._start_step + 1)
+        due_step = test._start_step + periods_to_complete
+        self._due_step[test] = due_step
+        insort(self._by_seq, (seq, test))   # seqs are unique, so tests are never compared
+        heapq.heappush(self._by_due, (due_step, seq, test))
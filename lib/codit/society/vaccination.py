@@ -1,16 +1,16 @@
 import numpy as np
-import random
 import logging
 
 from codit import share_dir
 import pandas as pd
+from codit.streams import STREAMS
 
 VACCINE_DATA = share_dir() / "codit" / "data" / "city" / "population" / "COVID-19_Vaccine_update_Report -25_Mar_2021.csv"
 
 
 def vaccinate(people, proportion, maker='AstraZeneca'):
     to_vaccinate = int(np.round(len(people) * proportion))
-    for p in random.sample(people, to_vaccinate):
+    for p in STREAMS.society.sample(people, to_vaccinate):
         p.vaccinate_with(maker)
 
 
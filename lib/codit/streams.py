@@ -0,0 +1,151 @@
+"""
+Named streams of random numbers, one for each part of the simulation which draws them.
+By default every stream draws from the global random and numpy.random modules, as the simulator always has;
+an Outbreak or a population given a seed draws instead from streams of its own, independent of each other
+and of anything else running in the same process.
+"""
+
+import random
+from contextlib import contextmanager
+
+import numpy as np
+
+STREAM_NAMES = ['structure',     # building the network of contacts
+                'seeding',       # choosing whom to seed infections in
+                'encounters',    # forming groups of people who meet
+                'transmission',  # whether an infectious person infects another
+                'people',        # the symptoms and decisions of individual people
+                'society',       # the testing, tracing and isolation policies of a society
+                'tests']         # the outcome of each test
+
+BUFFER_SIZE = 4096
+
+
+class Stream:
+    """
+    The methods of random (random, choice, choices, sample, shuffle, randint) together with self.np,
+    which has those of numpy.random.Generator (random, exponential, poisson, uniform, ...)
+    """
+    def __init__(self, seed_seq=None):
+        """
+        :param seed_seq: a numpy.random.SeedSequence, or None to draw from the global random and numpy.random
+        """
+        self.seeded = seed_seq is not None
+        if self.seeded:
+            self.py = random.Random(int.from_bytes(seed_seq.generate_state(4).tobytes(), 'little'))
+            self.np = np.random.default_rng(seed_seq)
+            self._buffer = []
+        else:
+            self.py = random
+            self.np = np.random
+            self.random = random.random
+        self.bind()
+
+    def bind(self):
+        self.choice = self.py.choice
+        self.choices = self.py.choices
+        self.sample = self.py.sample
+        self.shuffle = self.py.shuffle
+        self.randint = self.py.randint
+
+    def random(self):
+        """
+        :return: a uniform draw on [0, 1). Seeded streams draw these from numpy in bulk, BUFFER_SIZE at a time.
+        """
+        try:
+            return self._buffer.pop()
+        except IndexError:
+            self._refill()
+            return self._buffer.pop()
+
+    def _refill(self):
+        self._refilled_from = self.np.bit_generator.state
+        self._buffer = self.np.random(BUFFER_SIZE).tolist()
+
+    def __getstate__(self):
+        if not self.seeded:
+            return dict(seeded=False, py=random.getstate(), np=np.random.get_state())
+        # rather than the buffer itself, keep the state it was drawn from, and how much of it is left
+        return dict(seeded=True, py=self.py.getstate(), np=self.np.bit_generator.state,
+                    refilled_from=getattr(self, '_refilled_from', None), left=len(self._buffer))
+
+    def __setstate__(self, state):
+        self.seeded = state['seeded']
+        if self.seeded:
+            self.py = random.Random()
+            self.py.setstate(state['py'])
+            self.np = np.random.default_rng()
+            self._buffer = []
+            if state['left']:
+                self.np.bit_generator.state = state['refilled_from']
+                self._refill()
+                del self._buffer[state['left']:]
+            self.np.bit_generator.state = state['np']
+        else:
+            random.setstate(state['py'])
+            np.random.set_state(state['np'])
+            self.py = random
+            self.np = np.random
+            self.random = random.random
+        self.bind()
+
+
+class RandomStreams:
+    """
+    One Stream for each of STREAM_NAMES, as attributes
+    """
+    def __init__(self, seed=None):
+        """
+        :param seed: an int, a numpy.random.SeedSequence or numpy.random.Generator from which independent
+        child streams are derived, or None for streams which all draw from the global random and numpy.random
+        """
+        self.seeded = seed is not None
+        if self.seeded:
+            if isinstance(seed, np.random.Generator):
+                seed = np.random.SeedSequence(seed.integers(0, 2 ** 63, size=4).tolist())
+            elif not isinstance(seed, np.random.SeedSequence):
+                seed = np.random.SeedSequence(seed)
+            children = seed.spawn(len(STREAM_NAMES))
+        else:
+            children = [None] * len(STREAM_NAMES)
+        for name, child in zip(STREAM_NAMES, children):
+            setattr(self, name, Stream(child))
+
+
+def as_streams(seed):
+    """
+    :param seed: a RandomStreams, or anything from which one can be built
+    """
+    return seed if isinstance(seed, RandomStreams) else RandomStreams(seed)
+
+
+# the streams which the simulator draws from at present: switch these with using(streams)
+STREAMS = RandomStreams()
+_GLOBAL_STREAMS = {name: getattr(STREAMS, name) for name in STREAM_NAMES}
+
+
+@contextmanager
+def using(streams):
+    """
+    Within this context, draw random numbers from streams (a RandomStreams, or None for the global generators)
+    """
+    previous = {name: getattr(STREAMS, name) for name in STREAM_NAMES}
+    for name in STREAM_NAMES:
+        setattr(STREAMS, name, getattr(streams, name) if streams is not None else _GLOBAL_STREAMS[name])
+    try:
+        yield streams
+    finally:
+        for name, stream in previous.items():
+            setattr(STREAMS, name, stream)
+
+
+@contextmanager
+def seeded(seed):
+    """
+    Within this context, draw random numbers from streams derived from seed, or if it is None, from the current streams
+    """
+    if seed is None:
+        yield STREAMS
+        return
+    with using(as_streams(seed)) as streams:
+        yield streams
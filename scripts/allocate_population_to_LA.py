@@ -4,20 +4,20 @@
 Script to clear any pending alerts in the background.
 """
 import argparse
+import logging
 import sys
-from codit.population.networks import query_accommodation_coords
+from codit.population.networks import pipeline
+from codit.population.networks.home_locations import build_ward_shapes
 from codit.population.networks.city_config.city_cfg import city_paras
-from codit.population.networks.home_locations import build_households_home_list, allocate_coordinates_to_districts, \
-    COORDINATES_CSV
 
 CITY_OBSERVE = 'Leeds'
-DISTRICT_WARD = 'Ward'
-DISTRICT_LSOA = 'LSOA'
 
 parser = argparse.ArgumentParser()
 
 parser.add_argument("--city", type=str, default=None,
                     help="name of the area for coordinates enquiries")
+parser.add_argument("--cities", type=str, nargs='+', default=None,
+                    help="build several cities side by side, each in its own data namespace, in parallel processes")
 parser.add_argument("--server_sleep_seconds", type=int, default=10,
                     help="seconds to sleep between queries of the openstreetmap server")
 parser.add_argument("--extract_coordinates", action='store_true', default=False,
@@ -28,29 +28,50 @@ parser.add_argument("--allocate_coordinates_to_lsoa", action='store_true', defau
                     help="allocate coordinates of buildings to LSOA")
 parser.add_argument("--create_full_homes_list", action='store_true', default=False,
                     help="allocate households into the accommodation buildings in wards")
+parser.add_argument("--clip_ward_shapes", action='store_true', default=False,
+                    help="save the simplified boundaries of the city's wards, for drawing maps")
+parser.add_argument("--all_stages", action='store_true', default=False,
+                    help="run every stage, skipping those whose outputs are already up to date")
+parser.add_argument("--force", action='store_true', default=False,
+                    help="rerun the requested stages even if their cached outputs are up to date")
+parser.add_argument("--seed", type=int, default=None,
+                    help="seed for the random allocation of households into buildings")
+parser.add_argument("--workers", type=int, default=2,
+                    help="the number of stages allowed to run concurrently")
 
 
 args = parser.parse_args()
 
 
 def main():
-    if args.extract_coordinates:
-        if args.city is not None:
-            city_name = args.city
-        else:
-            city_name = CITY_OBSERVE
-        query_accommodation_coords.request_coords_to_csv(COORDINATES_CSV,
-                                                         city_paras[city_name]['area_str'],
-                                                         args.server_sleep_seconds)
-
-    if args.allocate_coordinates_to_wards:
-        allocate_coordinates_to_districts(DISTRICT_WARD)
-
-    if args.allocate_coordinates_to_lsoa:
-        allocate_coordinates_to_districts(DISTRICT_LSOA)
-
-    if args.create_full_homes_list:
-        build_households_home_list()
+    logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', level=logging.INFO)
+    requested = {pipeline.STAGE_EXTRACT: args.extract_coordinates,
+                 pipeline.STAGE_WARDS: args.allocate_coordinates_to_wards,
+                 pipeline.STAGE_LSOA: args.allocate_coordinates_to_lsoa,
+                 pipeline.STAGE_HOMES: args.create_full_homes_list}
+    stage_names = None if args.all_stages else {name for name, wanted in requested.items() if wanted}
+
+    if args.cities:
+        pipeline.build_city_datasets(args.cities, stage_names=stage_names, force=args.force, seed=args.seed,
+                                     server_sleep_seconds=args.server_sleep_seconds, max_workers=args.workers)
+        if args.clip_ward_shapes:
+            for city in args.cities:
+                build_ward_shapes(city)
+        sys.exit()
+
+    city_name = args.city or CITY_OBSERVE
+    stages = pipeline.home_location_stages(area_str=city_paras[city_name]['area_str'],
+                                           server_sleep_seconds=args.server_sleep_seconds,
+                                           seed=args.seed)
+    if stage_names is not None:
+        stages = [s for s in stages if s.name in stage_names]
+
+    pipeline.run_pipeline(stages, force=args.force, max_workers=args.workers)
+
+    if args.clip_ward_shapes:
+        # a single city's data replace the default city's, in the default namespace, so its wards are clipped from there
+        logging.info(f"Clipping the ward boundaries of {city_name}")
+        build_ward_shapes(city=None)
 
     sys.exit()
 
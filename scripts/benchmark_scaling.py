@@ -0,0 +1,56 @@
+# !/usr/bin/env python
+
+"""
+Script to benchmark building populations and simulating outbreaks on them, at increasing sizes,
+and to flag any scenario which has become slower, or uses more memory, than in a saved baseline.
+"""
+import argparse
+import logging
+import sys
+from codit import benchmark
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument("--populations", type=str, nargs='+', default=benchmark.POPULATION_TYPES,
+                    choices=benchmark.POPULATION_TYPES, help="the types of population to build")
+parser.add_argument("--societies", type=str, nargs='+', default=None,
+                    choices=benchmark.SOCIETY_TYPES + ['Society'],
+                    help="the societies for the populations to adopt, by default all those each type supports")
+parser.add_argument("--sizes", type=int, nargs='+', default=benchmark.SIZES,
+                    help="the numbers of people in the populations")
+parser.add_argument("--days", type=int, default=30,
+                    help="the days of each outbreak to simulate")
+parser.add_argument("--seed", type=int, default=0,
+                    help="seed for building each population and simulating its outbreak")
+parser.add_argument("--output", type=str, default="benchmark_results.json",
+                    help="the file to write the results to")
+parser.add_argument("--baseline", type=str, default=None,
+                    help="a file of results from an earlier run, to compare with")
+parser.add_argument("--tolerance", type=float, default=0.2,
+                    help="the proportion by which a measure may be worse than its baseline before it is flagged")
+
+
+args = parser.parse_args()
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', level=logging.WARNING)
+    results = benchmark.run_suite(args.populations, args.societies, args.sizes, n_days=args.days, seed=args.seed)
+    benchmark.save(results, args.output)
+
+    baseline = benchmark.load(args.baseline) if args.baseline else None
+    print(benchmark.results_table(results, baseline))
+    if baseline is None:
+        sys.exit()
+
+    regressions = benchmark.compare(results, baseline, args.tolerance)
+    for r in regressions:
+        if r['measure'] == 'error':
+            print(f"REGRESSION {r['scenario']}: now fails with {r['value']}")
+        else:
+            print(f"REGRESSION {r['scenario']}: {r['measure']} is {r['value']:.2f}, against {r['baseline']:.2f}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,22 +13,24 @@ ALL_TIME_DAYS = 50
 def test_uk_ovespill_model():
     from codit.society.alternatives import UKSociety
     from codit.disease import Covid
-    random.seed(42)
-    np.random.seed(42)
-    o = Outbreak(UKSociety(census=None, config=dict(PROB_NON_C19_SYMPTOMS_PER_DAY=0.1)),
-                 Covid(), pop_size=1000, seed_size=20, n_days=ALL_TIME_DAYS)
-    o.simulate()
 
-    # Skip this test because the the simulator is not deterministic.
-    # I believe it is because it uses np.random by calls multi-threaded numpy code.
-    # TODO: I believe the correct solution is for the simulator to be constructed with its own np.random.RandomState class
-    #
-    return
-    np.testing.assert_allclose(o.recorder.main_component.story[40:45] == [[41.0, 0.035, 0.0, 0.007, 0.467, 0.452],
-                                                           [42.0, 0.035, 0.0, 0.007, 0.458, 0.442],
-                                                           [43.0, 0.035, 0.0, 0.007, 0.461, 0.447],
-                                                           [44.0, 0.035, 0.0, 0.007, 0.458, 0.448],
-                                                           [45.0, 0.035, 0.0, 0.007, 0.457, 0.448]])
+    def story():
+        o = Outbreak(UKSociety(census=None, config=dict(PROB_NON_C19_SYMPTOMS_PER_DAY=0.1)),
+                     Covid(), pop_size=1000, seed_size=20, n_days=ALL_TIME_DAYS, seed=42)
+        o.simulate()
+        return o.recorder.main_component.story
+
+    # a seeded outbreak draws from random streams of its own, so is reproducible whatever the global generators do
+    random.seed(1)
+    first = story()
+    random.random()
+    np.random.random()
+    assert story() == first
+    np.testing.assert_allclose(first[40:45], [[41.0, 0.026, 0.0, 0.007, 0.456, 0.442],
+                                              [42.0, 0.026, 0.0, 0.007, 0.46, 0.449],
+                                              [43.0, 0.026, 0.0, 0.007, 0.468, 0.46],
+                                              [44.0, 0.026, 0.0, 0.007, 0.472, 0.472],
+                                              [45.0, 0.026, 0.0, 0.007, 0.469, 0.473]], atol=0.0005)
 
 
 def test_covid_model():
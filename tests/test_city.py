@@ -63,4 +63,21 @@ def test_house_size():
     houses = thh.house(10, cfg.SENIOR_WEIGHT, house_size=3)
     mean = np.mean([len(home) for home in houses])
 
-    assert mean == 3
\ No newline at end of file
+    assert mean == 3
+
+
+def test_proximity_pairs():
+    from types import SimpleNamespace
+    from codit.population.networks.proximity import build_proximity_pairs, home_positions
+    np.random.seed(0)
+    people = [SimpleNamespace(name=i, home=SimpleNamespace(building=SimpleNamespace(lon=lon, lat=lat)))
+              for i, (lon, lat) in enumerate(zip(np.random.uniform(-1.6, -1.5, 5000),
+                                                 np.random.uniform(53.78, 53.82, 5000)))]
+    radius = 200.
+    pairs = build_proximity_pairs(people, 2., radius)
+    assert len(pairs) > 0.75 * len(people)
+    assert len({frozenset(pr) for pr in pairs}) == len(pairs)
+    positions = home_positions(people)
+    for i, j in (tuple(pr) for pr in pairs):
+        assert i != j
+        assert np.linalg.norm(positions[i] - positions[j]) <= radius
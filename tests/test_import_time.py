@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET_SECONDS = 1.0   # numpy and the simulator itself take a small fraction of this
+HEAVY_MODULES = ['matplotlib', 'pandas', 'geopandas', 'smart_open', 'scipy']
+
+
+def test_import_time():
+    """
+    Every worker of a pool imports the simulator as it starts: plotting, geography and data files wait until used
+    """
+    script = ("import sys, time; start = time.perf_counter(); import codit.outbreak, codit.society.lateral; "
+              "print(time.perf_counter() - start); print(' '.join(sorted(sys.modules)))")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))   # to find codit wherever this process did
+    out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                         env=env).stdout.splitlines()
+    seconds, modules = float(out[0]), set(out[1].split())
+    assert not modules & set(HEAVY_MODULES)
+    assert seconds < IMPORT_BUDGET_SECONDS
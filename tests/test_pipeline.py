@@ -0,0 +1,46 @@
+from codit.population.networks.pipeline import Stage, run_pipeline
+
+
+def copy_upper(source, target):
+    with open(source) as fh:
+        text = fh.read()
+    with open(target, 'w') as fh:
+        fh.write(text.upper())
+
+
+def join_files(sources, target):
+    with open(target, 'w') as fh:
+        for s in sources:
+            with open(s) as src:
+                fh.write(src.read())
+
+
+def build_stages(tmp_path):
+    raw, extra = str(tmp_path / 'raw.txt'), str(tmp_path / 'extra.txt')
+    a, b, out = str(tmp_path / 'a.txt'), str(tmp_path / 'b.txt'), str(tmp_path / 'out.txt')
+    return [Stage('a', copy_upper, inputs=[raw], outputs=[a], params=dict(source=raw, target=a)),
+            Stage('b', copy_upper, inputs=[raw], outputs=[b], params=dict(source=raw, target=b)),
+            Stage('out', join_files, inputs=[a, b, extra], outputs=[out],
+                  params=dict(sources=[a, b, extra], target=out), requires=['a', 'b'])]
+
+
+def test_stage_cache(tmp_path):
+    (tmp_path / 'raw.txt').write_text('leeds')
+    (tmp_path / 'extra.txt').write_text('1')
+    manifest = str(tmp_path / 'manifest.json')
+
+    timings = run_pipeline(build_stages(tmp_path), manifest_path=manifest)
+    assert all(t is not None for t in timings.values())
+    assert (tmp_path / 'out.txt').read_text() == 'LEEDSLEEDS1'
+
+    timings = run_pipeline(build_stages(tmp_path), manifest_path=manifest)
+    assert all(t is None for t in timings.values())
+
+    (tmp_path / 'extra.txt').write_text('2')
+    timings = run_pipeline(build_stages(tmp_path), manifest_path=manifest)
+    assert timings['a'] is None and timings['b'] is None and timings['out'] is not None
+    assert (tmp_path / 'out.txt').read_text() == 'LEEDSLEEDS2'
+
+    (tmp_path / 'a.txt').unlink()
+    timings = run_pipeline(build_stages(tmp_path), manifest_path=manifest)
+    assert timings['a'] is not None and timings['b'] is None and timings['out'] is None
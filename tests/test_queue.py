@@ -0,0 +1,159 @@
+from codit.society.test import TestQueue
+
+
+class Person:
+    contacts = set()
+    disease = None
+    isolating = False
+    infectious = False
+
+    def __init__(self, name):
+        self.name = name
+
+
+def test_queue_order_and_capacity():
+    q = TestQueue()
+    people = [Person(i) for i in range(6)]
+    for p in people[:4]:
+        q.add_test(p, 'symptoms', 1.)
+    q.add_test(people[4], 'contact', 1., front_of_queue=True)
+    q.add_test(people[5], 'valency', 1., days_delayed_start=1.)
+    q.add_test(people[0], 'symptoms', 1.)
+    assert len(q.contains_planned_test_of(people[0])) == 1
+
+    q.update_tests(0.5)
+    assert q.swabbed_count == 5 and q.pick_actionable_tests(None) == []
+    q.update_tests(0.5)
+    assert [t.person.name for t in q.pick_actionable_tests(None)] == [4, 0, 1, 2, 3]
+    assert [t.person.name for t in q.pick_actionable_tests(3)] == [4, 0, 1]
+
+    t = q.tests_of(people[1])[0]
+    q.remove_test(t)
+    assert t.days_elapsed == 1. and '_clock' not in t.__dict__
+    q.update_tests(0.5)
+    assert t.days_elapsed == 1.
+    assert [t.person.name for t in q.pick_actionable_tests(3)] == [4, 0, 2]
+    assert q.contains_planned_test_of(people[5]) == []
+    q.update_tests(0.5)
+    q.update_tests(0.5)
+    assert [t.person.name for t in q.pick_actionable_tests(None)] == [4, 0, 2, 3, 5]
+
+
+def test_expire_planned_tests():
+    q = TestQueue()
+    people = [Person(i) for i in range(3)]
+    q.add_test(people[0], 'valency', 0.5, days_delayed_start=5.)
+    q.add_test(people[1], 'valency', 0.5, days_delayed_start=1.)
+    for _ in range(4):
+        assert q.expire_planned_tests(1.5) == []
+        q.update_tests(0.5)
+    q.add_test(people[2], 'valency', 0.5, days_delayed_start=5.)
+    assert [t.person.name for t in q.expire_planned_tests(1.5)] == [0]
+    assert q.swabbed_count == 1 and len(q.contains_planned_test_of(people[2])) == 1
+    assert people[0] not in q.index
+    assert q.index.swabbed(people[1]) == 1 and q.index.planned(people[2]) == 1
+
+
+def test_susceptible_contact_counts():
+    import random
+    from codit.society import Society
+    from codit.disease import Covid
+    from codit.population.population import FixedNetworkPopulation
+    from codit.society.test import SusceptibleContactCounts, count_susceptible_contacts
+    random.seed(1)
+    pop = FixedNetworkPopulation(300, Society())
+    counts = SusceptibleContactCounts()
+    for p in random.sample(list(pop.people), 100):
+        p.set_infected(Covid())
+        assert counts.of(p, pop.census) == count_susceptible_contacts(p, pop.census)
+    for p in pop.people:
+        assert counts.of(p, pop.census) == count_susceptible_contacts(p, pop.census)
+    assert counts.counts is not None
+
+
+def test_contact_counts_follow_structure():
+    import random
+    from codit.society import Society
+    from codit.population.population import FixedNetworkPopulation
+    from codit.society.test import count_susceptible_contacts
+    random.seed(2)
+    s = Society()
+    pop = FixedNetworkPopulation(300, s)
+    people = list(pop.people)
+    assert [s.contact_counts.of(p, pop.census) for p in people] == \
+           [count_susceptible_contacts(p, pop.census) for p in people]
+    before = {p.name: p.contacts for p in people}
+    pop.set_structure(s)
+    assert any(p.contacts != before[p.name] for p in people)
+    assert [s.contact_counts.of(p, pop.census) for p in people] == \
+           [count_susceptible_contacts(p, pop.census) for p in people]
+    names, owners = s.contact_counts.contacts_of(people, pop.census)
+    assert sorted(zip(owners.tolist(), names.tolist())) == sorted((i, c) for i, p in enumerate(people) for c in p.contacts)
+    counts = s.contact_counts
+    s.clear_queues()
+    assert s.contact_counts is not counts and all(q.contact_counts is s.contact_counts for q in s.queues)
+
+
+def test_recorder_spill(tmp_path):
+    import numpy as np
+    from codit.society.test import Test
+    from codit.society.records import TestRecorder
+    recorder = TestRecorder(capacity=4, spill_path=str(tmp_path / 'tests'), spill_rows=8)
+    for i in range(30):
+        t = Test(Person(i), ('contact', 1) if i % 2 else 'symptoms', 1.)
+        t.positive = i % 3 == 0
+        recorder.append(t)
+    assert len(recorder) == 30 and len(recorder.spilled) == 3
+    df = recorder.to_dataframe()
+    assert df.person.tolist() == list(range(30))
+    assert df.notes.iloc[1] == ('contact', 1) and df.positive.sum() == 10
+    assert np.isnan(df._succeptible_contacts).all() and (df.contacts == 0).all()
+    recorder.clear()
+    assert len(recorder) == 0 and not list(tmp_path.iterdir())
+
+
+def test_scheduler_policies():
+    from codit.society import Society
+    from codit.society.scheduler import QueueSpec, StrictPriority, WeightedShare, DeadlineFirst
+    s = Society()
+    s.declare_queues([QueueSpec('regional', turnaround=1.), QueueSpec('central', turnaround=0.5, priority=-1),
+                      QueueSpec('spare', share=0.5)], policy=WeightedShare())
+    regional, central, spare = s.queues
+    assert s.scheduler.by_priority == [central, regional, spare]
+    people = iter(Person(i) for i in range(100))
+    for q, n in ((regional, 6), (central, 2), (spare, 6)):
+        for _ in range(n):
+            q.add_test(next(people), 'symptoms', s.scheduler.turnaround(s.scheduler.specs[s.queues.index(q)].name))
+    for _ in range(2):
+        for q in s.queues:
+            q.update_tests(0.5)
+
+    # central has no share, so is allotted all 8, and regional the 6 central did not use, then spare its 4
+    s.scheduler.allocate(8)
+    assert [len(q.completed_tests) for q in s.queues] == [6, 2, 4]
+
+    s.scheduler.policy = StrictPriority()
+    s.scheduler.allocate(9)
+    assert [len(q.completed_tests) for q in s.queues] == [6, 2, 1]
+
+    s.scheduler.policy = DeadlineFirst()
+    s.scheduler.allocate(5)
+    # central's tests were due a period before the others, which then alternate
+    assert [len(q.completed_tests) for q in s.queues] == [2, 2, 1]
+
+
+def test_scheduler_routing():
+    from codit.society import HighValencyTester
+    from codit.society.scheduler import QueueSpec
+    s = HighValencyTester()
+    s.declare_queues([QueueSpec('contacts', turnaround=0.5, notes={'contact', 'contact two'}),
+                      QueueSpec('valency', turnaround=lambda cfg: 2., notes=lambda notes: notes == 'valency'),
+                      QueueSpec('main')])
+    people = [Person(i) for i in range(3)]
+    s.add_test(people[0], 'contact')
+    s.add_test(people[1], 'symptoms')
+    s.handle_connected_person(people[2])
+    planned = [[(t.person, t.days_to_complete) for p in people for t in q.contains_planned_test_of(p)]
+               for q in s.queues]
+    assert planned == [[(people[0], 0.5)], [(people[2], 2. + s.VALENCY_TEST_FREQUENCY_DAYS)],
+                       [(people[1], s.cfg.TEST_DAYS_ELAPSED)]]
@@ -29,3 +29,7 @@ def test_build_home_list():
     assert df.describe().sum().sum() == pytest.approx(543875.654865)
 
 
+def test_ward_shapes_path():
+    path = home_locations.ward_shapes_path()
+    assert path == home_locations.ward_shapes_path(tolerance=home_locations.WARD_SHAPES_TOLERANCE)
+    assert path != home_locations.ward_shapes_path(tolerance=home_locations.WARD_SHAPES_TOLERANCE / 2)
@@ -2,7 +2,7 @@ import random
 import numpy as np
 
 from codit.outbreak import Outbreak
-from codit.outbreak_recorder import VariantComponent
+from codit.outbreak_recorder import OutbreakRecorder, VariantComponent
 from codit.society import TestingTracingSociety, ContactTestingSociety
 from codit.society.strategic import TwoTrackTester
 from codit.disease import Covid
@@ -93,3 +93,257 @@ def test_recorder_components():
     o = Outbreak(s, Covid(), pop_size=8, seed_size=1, n_days=ALL_TIME_DAYS, show_heatmap=True)
     o.recorder.add_component(VariantComponent())
     o.simulate()
+
+
+def test_visualiser_tracks_infections():
+    s = TwoTrackTester(episodes_per_day=2)
+    o = Outbreak(s, Covid(), pop_size=300, seed_size=10, n_days=ALL_TIME_DAYS, show_heatmap=True)
+    visualiser = o.recorder.components[1].visualiser
+    people = list(o.pop.people)
+    for _ in range(o.n_periods):
+        o.update_time()
+        s.manage_outbreak(o.pop)
+        o.pop.attack_in_groupings(o.group_size)
+        assert visualiser.unwell == {i for i, p in enumerate(people) if p.disease is not None}
+    visualiser.close_plt()
+
+
+def test_high_valency_people():
+    from codit.society import Society
+    from codit.population.population import FixedNetworkPopulation
+    random.seed(7)
+    pop = FixedNetworkPopulation(500, Society())
+    assert pop.high_valency_people(12) == [p for p in pop.people if len(p.contacts) >= 12]
+    assert pop.high_valency_people(12, inclusive=False) == [p for p in pop.people if len(p.contacts) > 12]
+    degrees = sorted(pop.contacts.values(), key=len)
+    assert pop.degree_quantile(0.9) == len(degrees[int(0.9 * 500) - 1])
+
+
+def test_batch_tracing():
+    from codit.society.lateral import LateralFlowUK
+    for society_type in (ContactTestingSociety, LateralFlowUK):
+        s = society_type()
+        s.BATCH_TRACING = True
+        random.seed(5)
+        np.random.seed(5)
+        o = Outbreak(s, Covid(), pop_size=1000, seed_size=20, n_days=ALL_TIME_DAYS)
+        o.simulate()
+        assert s.test_recorder.to_dataframe().notes.astype(str).str.contains('contact').any()
+
+
+def test_merged_requests_each_overlooked(monkeypatch):
+    from codit.society.lateral import LateralFlowUK
+    s = LateralFlowUK()
+    o = Outbreak(s, Covid(), pop_size=20, n_days=1)
+    draws = []
+    monkeypatch.setattr(s, 'overlook_test', lambda: draws.append(1) or len(draws) < 3)
+    s.get_test_request(o.pop.census[0], notes=('contact', 1), lateral_flow=True, requests=3)
+    assert len(draws) == 3 and len(s.test_index) == 1
+
+
+def test_symptom_register():
+    from codit.society.basic import DraconianSociety
+    s = DraconianSociety(episodes_per_day=2)
+    random.seed(11)
+    np.random.seed(11)
+    o = Outbreak(s, Covid(), pop_size=1000, seed_size=50, n_days=ALL_TIME_DAYS)
+    onsets = []
+    o.pop.symptoms.subscribe(onsets.append)
+    for _ in range(o.n_periods):
+        o.update_time()
+        assert o.pop.symptoms.people == {p for p in o.pop.people if p.symptomatic}
+        s.manage_outbreak(o.pop)
+        assert all(p.isolating for p in o.pop.people if p.symptomatic)
+        o.pop.attack_in_groupings(o.group_size)
+    assert onsets and all(p.covid_experiences for p in onsets)
+
+
+def test_looper():
+    from functools import partial
+    from codit.looper import run_ensemble, summary_table
+    from codit.society import Society, UKSociety
+    from codit.population.covid import PersonCovid
+    from codit.population.networks.household_workplace import HouseholdWorkplacePopulation
+    population_factory = partial(HouseholdWorkplacePopulation, 200, Society(), person_type=PersonCovid)
+    scenarios = {'UK': (UKSociety, dict(), dict()),
+                 'Naive': (Society, dict(), dict(PROB_ISOLATE_IF_SYMPTOMS=0))}
+    kwargs = dict(replicates=3, seed_size=4, n_days=10, seed=7)
+    serial = run_ensemble(population_factory, scenarios, max_workers=1, **kwargs)
+    pooled = run_ensemble(population_factory, scenarios, max_workers=2, max_in_flight=2, **kwargs)
+    np.testing.assert_equal(serial, pooled)
+    assert [r['replicate'] for r in serial['UK']] == [0, 1, 2]
+    assert len(summary_table(serial).splitlines()) == 3
+
+
+def test_looper_shared_population():
+    from codit.looper import run_ensemble
+    from codit.society import Society, UKSociety
+    from codit.population.covid import PersonCovid
+    from codit.population.networks.household_workplace import HouseholdWorkplacePopulation
+    random.seed(3)
+    population = HouseholdWorkplacePopulation(200, Society(), person_type=PersonCovid)
+    scenarios = {'UK': (UKSociety, dict(), dict())}
+    kwargs = dict(replicates=3, seed_size=4, n_days=10, seed=7, population=population)
+    serial = run_ensemble(None, scenarios, max_workers=1, **kwargs)
+    pooled = run_ensemble(None, scenarios, max_workers=2, **kwargs)
+    np.testing.assert_equal(serial, pooled)
+
+    # a consumer which stops part way leaves no population shared with the next ensemble
+    from codit import looper
+    results = looper.iterate_ensemble(None, scenarios, max_workers=1, **kwargs)
+    next(results)
+    results.close()
+    assert looper._shared_population is None
+
+
+def test_checkpoint_branch():
+    from codit.society import UKSociety
+    from codit.society.lateral import LateralFlowUK
+
+    def outbreak():
+        return Outbreak(LateralFlowUK(), Covid(), pop_size=500, seed_size=10, n_days=20, seed=11)
+
+    full = outbreak().simulate().main_component.story
+    o = outbreak()
+    o.simulate(until_day=8)
+    checkpoint = o.checkpoint()
+    o.simulate()
+    assert o.recorder.main_component.story == full
+    for _ in range(2):
+        branch = checkpoint.branch()
+        assert branch.simulate().main_component.story == full
+    other = checkpoint.branch(society=UKSociety(config=dict(PROB_ISOLATE_IF_TESTPOS=0.2)))
+    story = other.simulate().main_component.story
+    assert story[:checkpoint.step_num] == full[:checkpoint.step_num] and len(story) == len(full)
+
+
+def test_stop_when_settled():
+    from codit.society import UKSociety
+
+    def story(stop_when_settled):
+        Outbreak.STOP_WHEN_SETTLED = stop_when_settled
+        try:
+            o = Outbreak(UKSociety(config=dict(PROB_NON_C19_SYMPTOMS_PER_DAY=0)), Covid(),
+                         pop_size=300, seed_size=1, n_days=60, seed=4)
+            return o.simulate()
+        finally:
+            Outbreak.STOP_WHEN_SETTLED = True
+
+    full, skipped = story(False), story(True)
+    assert skipped.skipped_steps > 0 and full.skipped_steps == 0
+    assert skipped.main_component.story == full.main_component.story
+
+    o = Outbreak(UKSociety(), Covid(), pop_size=300, seed_size=10, n_days=60, seed=4)
+    story = o.simulate(stop=lambda o: o.pop.count_infected() >= 20).main_component.story
+    assert story[-1][1] * 300 >= 20 and len(story) < 60
+
+
+def test_skip_quiescent_transmission(monkeypatch):
+    from codit.society import UKSociety
+    from codit.population import FixedNetworkPopulation
+    calls = []
+    attack = FixedNetworkPopulation.attack_in_groupings
+    monkeypatch.setattr(FixedNetworkPopulation, 'attack_in_groupings',
+                        lambda pop, *args, **kwargs: calls.append(1) or attack(pop, *args, **kwargs))
+
+    def story():
+        o = Outbreak(UKSociety(), Covid(), pop_size=500, seed_size=1, n_days=60, seed=4)   # the default worry rate
+        return o.simulate().main_component.story
+
+    skipped = story()
+    assert 0 < len(calls) < 60
+    monkeypatch.setattr(FixedNetworkPopulation, 'quiescent', lambda pop: False)
+    assert story() == skipped
+
+
+def test_reset_people():
+    from codit.society import UKSociety
+    from codit.population.covid import PersonCovid
+    from codit.population.networks.household_workplace import HouseholdWorkplacePopulation
+    random.seed(5)
+    pop = HouseholdWorkplacePopulation(300, UKSociety(), person_type=PersonCovid)
+    contacts = {p.name: set(p.contacts) for p in pop.people}
+    stories = [Outbreak(UKSociety(), Covid(), population=pop, seed_size=10, n_days=20, seed=1).simulate()
+               .main_component.story for _ in range(2)]
+    assert stories[0] == stories[1]
+
+    for p in pop.people:
+        p.leaked = 1
+    society = UKSociety()
+    pop.reset_people(society)
+    for p in pop.people:
+        fresh = PersonCovid(p.name, config=society.cfg.__dict__, home=p.home)
+        fresh.adopt_society(society)
+        state = {k: v for k, v in p.__dict__.items() if k not in ('cfg', 'contacts', 'symptom_register')}
+        assert state == {k: v for k, v in fresh.__dict__.items() if k != 'cfg'}
+        assert p.cfg.__dict__ == fresh.cfg.__dict__
+        assert p.contacts == contacts[p.name]
+    # as after restoring a checkpoint, each person has a config of their own
+    assert len({id(p.cfg) for p in pop.people}) == len(pop.people)
+
+
+def test_profile():
+    from codit.society.lateral import LateralFlowUK
+    plain = Outbreak(LateralFlowUK(), Covid(), pop_size=500, seed_size=20, n_days=20, seed=2).simulate()
+    profiled = Outbreak(LateralFlowUK(), Covid(), pop_size=500, seed_size=20, n_days=20, seed=2, profile=True).simulate()
+    assert plain.profiler is None
+    assert profiled.main_component.story == plain.main_component.story
+
+    report = profiled.profiler.report()
+    steps = len(plain.main_component.story) - plain.skipped_steps
+    for phase in ['update_time', 'manage_outbreak', 'attack_in_groupings', 'record_step', 'record_step/MainComponent']:
+        assert report['phases'][phase]['calls'] == steps
+    assert report['counters']['attacks attempted'] > 0
+    assert report['counters']['tests processed'] > 0
+
+    class CountingRecorder(OutbreakRecorder):
+        def record_step(self, o):
+            self.steps = getattr(self, 'steps', 0) + 1
+            OutbreakRecorder.record_step(self, o)
+
+    o = Outbreak(LateralFlowUK(), Covid(), pop_size=500, seed_size=20, n_days=20, seed=2, profile=True)
+    o.set_recorder(CountingRecorder(o))
+    recorder = o.simulate()
+    assert recorder.steps == steps and recorder.main_component.story == plain.main_component.story
+
+
+def test_benchmark():
+    from codit import benchmark
+    result = benchmark.run_scenario('FixedNetworkPopulation', 'UKSociety', 500, n_days=10, seed_fraction=0.02)
+    assert result['construction_seconds'] > 0 and result['person_days_per_second'] > 0 and result['peak_rss_mb'] > 0
+
+    assert result['n_cliques'] > 0
+    random_mixing = benchmark.run_scenario('Population', 'Society', 500, n_days=10, seed_fraction=0.02)
+    assert random_mixing['person_days_per_second'] > 0
+    assert benchmark.societies_of('Population') == ['Society']
+
+    baseline = dict(results={'a': dict(construction_seconds=1, person_days_per_second=1000, peak_rss_mb=100),
+                             'b': dict(error='FileNotFoundError'),
+                             'c': dict(construction_seconds=1, person_days_per_second=1000, peak_rss_mb=100)})
+    results = dict(results={'a': dict(construction_seconds=1.1, person_days_per_second=500, peak_rss_mb=100),
+                            'b': dict(construction_seconds=1, person_days_per_second=1, peak_rss_mb=1),
+                            'c': dict(error='AttributeError')})
+    assert [(r['scenario'], r['measure']) for r in benchmark.compare(results, baseline)] == \
+           [('a', 'person_days_per_second'), ('c', 'error')]
+
+
+def test_daily_transmission():
+    from codit.society import UKSociety
+    from codit.population.covid import PersonCovid
+    from codit.population.networks.household_workplace import HouseholdWorkplacePopulation
+
+    def stories(n_runs=1, **config):
+        pop = HouseholdWorkplacePopulation(500, UKSociety(config=config), person_type=PersonCovid, seed=7)
+        return [np.array(Outbreak(UKSociety(config=config), Covid(), population=pop, seed_size=10, n_days=30,
+                                  seed=s).simulate().main_component.story) for s in range(n_runs)]
+
+    # with one period a day, people meet once a day either way
+    np.testing.assert_array_equal(stories(SIMULATOR_DAILY_TRANSMISSION=True)[0], stories()[0])
+
+    # with four, meeting once a day, rather than in every period, makes for much the same epidemic
+    fine = stories(8, SIMULATOR_PERIODS_PER_DAY=4)
+    hybrid = stories(8, SIMULATOR_PERIODS_PER_DAY=4, SIMULATOR_DAILY_TRANSMISSION=True)
+    assert len(fine[0]) == len(hybrid[0]) == 120
+    for column in [1, 4, 5]:   # ever infected, waiting for test results, isolating
+        fine_mean, hybrid_mean = (np.mean([s[:, column].mean() for s in runs]) for runs in (fine, hybrid))
+        assert abs(hybrid_mean - fine_mean) < 0.15 * fine_mean